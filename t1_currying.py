@@ -2,33 +2,161 @@
 from __future__ import division
 
 import inspect
+from collections import namedtuple, OrderedDict
 from functools import wraps
+from importlib import import_module
 from itertools import chain, izip
+import multiprocessing
+import pickle
+import sys
+import threading
 import unittest
 
 
+_Signature = namedtuple('signature', ['positional', 'positional_set', 'defaults', 'required'])
+
+def _analyze_signature(f):
+    """
+    Get signature of f: names of positional arguments (list and set), dict of default values
+    and list of names of arguments without default values.
+    """
+    argspec = inspect.getargspec(f)
+    positional = argspec.args
+    default_arguments = argspec.defaults
+    if default_arguments is None:
+        defaults, required = {}, positional
+    else:
+        required, with_defaults = Curried._list_split_helper(positional, -len(default_arguments))
+        defaults = dict(zip(with_defaults, default_arguments))
+    return _Signature(positional=positional, positional_set=frozenset(positional),
+        defaults=defaults, required=required)
+
+
+_CacheInfo = namedtuple('cache_info', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_MISSING = object()
+
+class _LRUCache(object):
+    """
+    Thread-safe dict with at most maxsize (unbounded if None) least recently used items and hit/miss stats.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        """
+        Get value by key or _MISSING. Raise TypeError if key is unhashable.
+        """
+        with self._lock:
+            value = self._data.pop(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self._data[key] = value # move to the end as the most recently used
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self):
+        with self._lock:
+            return _CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+_Memo = namedtuple('memo', ['results', 'partials'])
+
+def _call_memoized(results, f, positional_args, extra, keyword_arguments):
+    """
+    Call f or take its result from results cache by canonical key of the arguments.
+    """
+    key = (positional_args, extra, frozenset(keyword_arguments.iteritems()))
+    try:
+        result = results.get(key)
+    except TypeError: # unhashable arguments can't be memoized
+        return f(*(positional_args + extra), **keyword_arguments)
+    if result is _MISSING:
+        result = f(*(positional_args + extra), **keyword_arguments)
+        results.put(key, result)
+    return result
 
 
 class Curried(object):
-    def __init__(self,f):
+    # Partial application of function f.
+    #
+    # Curried objects are immutable: each application returns a new Curried object
+    # (or the result of f, when all the arguments without default values are gathered),
+    # so a partial application may be reused, hashed, memoized and shared between threads.
+    # __doc__ of an instance is the docstring of f.
+    #
+    # With memo (see curry(memoize=True)) results of complete applications are cached
+    # by canonical key of the arguments and partial applications are cached by
+    # (parent partial application, arguments), so the same prefix gives the same object.
+
+    __slots__ = ('f', 'signature', 'memo', '_remaining', '_gathered', '_extra', '_hash')
+
+    def __init__(self, f, signature=None, memo=None):
+        if signature is None:
+            signature = _analyze_signature(f)
         self.f = f
+        self.signature = signature
+        self.memo = memo
+        self._remaining = tuple(signature.positional) # names which may still be passed positionally
+        self._gathered = tuple(signature.defaults.iteritems()) # (name, value) pairs, later ones override
+        self._extra = () # extra positional arguments
+        self._hash = None
 
-        self.__name__ = 'curried_{}'.format(f.func_name)
-        self.__module__ = f.__module__
-        self.__doc__ = f.__doc__
+    def _applied(self, remaining, gathered, extra):
+        curried = Curried.__new__(Curried)
+        curried.f = self.f
+        curried.signature = self.signature
+        curried.memo = self.memo
+        curried._remaining = remaining
+        curried._gathered = gathered
+        curried._extra = extra
+        curried._hash = None
+        return curried
 
-        self.positional_arguments = inspect.getargspec(f).args
-        self.positional_arguments_required = self.positional_arguments[:]
-        default_arguments = inspect.getargspec(f).defaults
-        if default_arguments is None:
-            self.gathered_arguments = {}
-            self.expected_arguments = set(self.positional_arguments)
-        else:
-            args_first, args_second = Curried._list_split_helper(
-                self.positional_arguments_required, -len(default_arguments))
-            self.gathered_arguments = dict(zip(args_second, default_arguments))
-            self.expected_arguments = set(args_first)
-        self.extra_positional_arguments = []
+    @property
+    def __name__(self):
+        return 'curried_{}'.format(self.f.func_name)
+
+    @property
+    def __doc__(self):
+        return self.f.__doc__
+
+    @property
+    def positional_arguments(self):
+        return self.signature.positional
+
+    @property
+    def positional_arguments_required(self):
+        return self._remaining
+
+    @property
+    def gathered_arguments(self):
+        return dict(self._gathered)
+
+    @property
+    def expected_arguments(self):
+        gathered = self.gathered_arguments
+        return frozenset(name for name in self.signature.required if name not in gathered)
+
+    @property
+    def extra_positional_arguments(self):
+        return self._extra
 
     @staticmethod
     def _list_split_helper(alist, *indices):
@@ -40,36 +168,73 @@ class Curried(object):
         pairs = izip(chain([0], indices), chain(indices, [None]))
         return (alist[i:j] for i, j in pairs)
 
-    def _update_gathered_and_expected_args_with_dict(self, args_as_dict):
-        self.gathered_arguments.update(args_as_dict)
-        self.expected_arguments.difference_update(args_as_dict.viewkeys())
-
     def __call__(self, *args, **kwargs):
+        remaining, extra = self._remaining, self._extra
         # get only needed part of args
-        if len(args) > len(self.positional_arguments_required):
-            self.extra_positional_arguments.extend(args[len(self.positional_arguments_required):])
-            args = args[:len(self.positional_arguments_required)]
+        if len(args) > len(remaining):
+            extra += args[len(remaining):]
+            args = args[:len(remaining)]
 
-        args_as_dict = dict(zip(self.positional_arguments_required, args))
-        self._update_gathered_and_expected_args_with_dict(args_as_dict)
-        self.positional_arguments_required = self.positional_arguments_required[len(args_as_dict):]
+        gathered = dict(self._gathered)
+        gathered.update(izip(remaining, args))
+        gathered.update(kwargs)
+        remaining = remaining[len(args):]
 
-        self._update_gathered_and_expected_args_with_dict(kwargs)
-
-        if not self.expected_arguments: # We have all obligatory arguments as for now
-            positional_dict, keyword_arguments = self._get_output_args_and_kwargs()
-            positional_args = [positional_dict[arg] for arg in self.positional_arguments]
-            return self.f(*(positional_args + self.extra_positional_arguments), **keyword_arguments)
+        if all(name in gathered for name in self.signature.required): # We have all obligatory arguments
+            positional_set = self.signature.positional_set
+            positional_args = tuple(gathered[arg] for arg in self.signature.positional)
+            keyword_arguments = dict((key, value) for key, value in gathered.iteritems()
+                if key not in positional_set)
+            if self.memo is not None:
+                return _call_memoized(self.memo.results, self.f, positional_args, extra, keyword_arguments)
+            return self.f(*(positional_args + extra), **keyword_arguments)
+        elif self.memo is not None:
+            partial_key = (self, args, frozenset(kwargs.iteritems()))
+            try:
+                partial = self.memo.partials.get(partial_key)
+            except TypeError: # unhashable arguments
+                return self._applied(remaining, tuple(gathered.iteritems()), extra)
+            if partial is _MISSING:
+                partial = self._applied(remaining, tuple(gathered.iteritems()), extra)
+                self.memo.partials.put(partial_key, partial)
+            return partial
         else:
-            return self
+            return self._applied(remaining, tuple(gathered.iteritems()), extra)
 
     def _get_output_args_and_kwargs(self):
-        args_dict = dict(((key, value) for (key, value) in self.gathered_arguments.iteritems()
-            if key in set(self.positional_arguments)))
-        kwargs = dict(((key, value) for (key, value) in self.gathered_arguments.iteritems()
-            if key not in set(self.positional_arguments)))
+        positional_set = self.signature.positional_set
+        args_dict = dict(((key, value) for (key, value) in self._gathered if key in positional_set))
+        kwargs = dict(((key, value) for (key, value) in self._gathered if key not in positional_set))
         return args_dict, kwargs
 
+    def _key(self):
+        return self.f, self._remaining, frozenset(dict(self._gathered).iteritems()), self._extra
+
+    def __eq__(self, other):
+        if not isinstance(other, Curried):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, Curried):
+            return NotImplemented
+        return self._key() != other._key()
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._key())
+        return self._hash
+
+    def __reduce__(self):
+        # A function decorated by curry is replaced in its module by the curry helper,
+        # so it can't be pickled by itself; then it's pickled as a reference to the helper.
+        module = sys.modules.get(self.f.__module__)
+        helper = getattr(module, self.f.__name__, None)
+        if helper is not self.f and getattr(getattr(helper, 'curried', None), 'f', None) is self.f:
+            return _restore_curried_by_reference, (self.f.__module__, self.f.__name__,
+                self._remaining, self._gathered, self._extra)
+        return _restore_curried, (self.f, self._remaining, self._gathered, self._extra)
+
     def __repr__(self):
         arguments_dict, keyword_arguments = self._get_output_args_and_kwargs()
         return 'curry({})({})'.format(self.f.func_name,
@@ -78,7 +243,16 @@ class Curried(object):
                 for key, value in chain(arguments_dict.iteritems(),keyword_arguments.iteritems())))
 
 
-def curry(f):
+def _restore_curried(f, remaining, gathered, extra):
+    return Curried(f)._applied(remaining, gathered, extra)
+
+
+def _restore_curried_by_reference(module_name, name, remaining, gathered, extra):
+    # the curry helper keeps its not applied Curried object (sharing its memo, if any)
+    return getattr(import_module(module_name), name).curried._applied(remaining, gathered, extra)
+
+
+def curry(f=None, memoize=False, maxsize=128):
     """
     Make function curried, so that it will accept this parameters passing.
     @curry
@@ -86,14 +260,76 @@ def curry(f):
         return a+b+c
 
     f(a,b,c) = f(a,b)(c) = f(a)(b,c) = f(a)(b)(c)
+
+    The signature of f is analyzed once, at decoration time.
+    Calls providing all the arguments without default values positionally
+    (and only extra arguments by keywords) call f directly.
+
+    @curry(memoize=True, maxsize=1024)
+    def f(a,b,c):
+        return a+b+c
+
+    caches results of f in LRU cache of maxsize items (unbounded if None) by the arguments
+    f is finally called with, so f(1)(2)(3) and f(1,2,c=3) share the cache entry.
+    Partial applications are cached as well (in a separate LRU cache of the same size).
+    Stats are available via f.cache_info() and f.partial_cache_info(), caches are cleared by f.cache_clear().
+    Calls with unhashable arguments are not cached.
     """
-    @wraps(f)
-    def helper(*args,**kwargs):
-        return Curried(f)(*args,**kwargs) #first invocation of curried function must return a new Curried object
+    if f is None:
+        return lambda f: curry(f, memoize=memoize, maxsize=maxsize)
+
+    signature = _analyze_signature(f)
+    required_number = len(signature.required)
+    positional_set = signature.positional_set
+    positional_number = len(signature.positional)
+    memo = _Memo(_LRUCache(maxsize), _LRUCache(maxsize)) if memoize else None
+    not_applied = Curried(f, signature, memo) # immutable, so it's shared by all the calls
+
+    if memo is None:
+        @wraps(f)
+        def helper(*args,**kwargs):
+            if len(args) >= required_number and (not kwargs or positional_set.isdisjoint(kwargs)):
+                return f(*args, **kwargs)
+            return not_applied(*args,**kwargs) # returns a new Curried object unless all the arguments are given
+    else:
+        missing_defaults = [tuple(signature.defaults[name] for name in signature.positional[i:])
+            for i in xrange(required_number, positional_number + 1)]
+
+        @wraps(f)
+        def helper(*args,**kwargs):
+            if len(args) >= required_number and (not kwargs or positional_set.isdisjoint(kwargs)):
+                if len(args) < positional_number:
+                    positional_args, extra = args + missing_defaults[len(args) - required_number], ()
+                else:
+                    positional_args, extra = args[:positional_number], args[positional_number:]
+                return _call_memoized(memo.results, f, positional_args, extra, kwargs)
+            return not_applied(*args,**kwargs)
+
+        helper.cache_info = memo.results.info
+        helper.partial_cache_info = memo.partials.info
+        def cache_clear():
+            memo.results.clear()
+            memo.partials.clear()
+        helper.cache_clear = cache_clear
     helper.__name__ = 'curried_{}'.format(f.func_name)
+    helper.curried = not_applied
     return helper
 
 
+def _add_three(a, b, c):
+    return a + b + c
+
+
+@curry
+def _curried_add_three(a, b, c):
+    return a + b + c
+
+
+@curry(memoize=True)
+def _memoized_add_three(a, b, c):
+    return a + b + c
+
+
 class TestCurry(unittest.TestCase):
 
     def setUp(self):
@@ -118,4 +354,105 @@ class TestCurry(unittest.TestCase):
     def test_overriding(self):
         self.assertEqual(self.f(1)(b=2,z=1)(10)(3), (1,10,3,4,(),{'z': 1}))
 
+    def test_complete_call_with_positional_keyword(self):
+        self.assertEqual(self.f(1,2,3,c=100), (1,2,100,4,(),{}))
+
+    def test_fast_path_calls_function_directly(self):
+        calls = []
+        def g(a, b=2):
+            calls.append(inspect.stack()[1][3])
+            return a, b
+        curried_g = curry(g)
+        self.assertEqual(curried_g(1), (1, 2))
+        self.assertEqual(curried_g(1, 3), (1, 3))
+        self.assertEqual(curried_g(a=1), (1, 2))
+        self.assertEqual(calls, ['helper', 'helper', '__call__'])
+
+    def test_partial_applications_are_independent(self):
+        g = self.f(1)
+        self.assertEqual(g(2)(3), (1,2,3,4,(),{}))
+        self.assertEqual(g(4)(5), (1,4,5,4,(),{}))
+        h = g(2, z=1)
+        self.assertEqual(h(3), (1,2,3,4,(),{'z': 1}))
+        self.assertEqual(h(5, 6, 7), (1,2,5,6,(7,),{'z': 1}))
+        self.assertEqual(g(2)(3), (1,2,3,4,(),{}))
+
+    def test_hashing_and_equality(self):
+        self.assertEqual(self.f(1)(2), self.f(1, 2))
+        self.assertEqual(len(set([self.f(1)(2), self.f(1, 2), self.f(2)])), 2)
+        self.assertNotEqual(self.f(1, z=1), self.f(1, z=2))
+
+    def test_slots(self):
+        self.assertRaises(AttributeError, setattr, self.f(1), 'x', 1)
+        self.assertEqual(self.f(1).__name__, 'curried_mul')
+
+    def test_pickling(self):
+        partial = Curried(_add_three)(1)(2)
+        self.assertEqual(pickle.loads(pickle.dumps(partial))(3), 6)
+
+    def test_pickling_decorated_function(self):
+        for f in (_curried_add_three, _memoized_add_three):
+            partial = pickle.loads(pickle.dumps(f(1)(2), pickle.HIGHEST_PROTOCOL))
+            self.assertEqual(partial(3), 6)
+            self.assertEqual(partial, f(1, 2))
+        pool = multiprocessing.Pool(2)
+        try:
+            self.assertEqual(pool.map(_curried_add_three(1, 2), [1, 2, 3]), [4, 5, 6])
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def test_sharing_between_threads(self):
+        g = self.f(1)
+        results = {}
+        def worker(i):
+            results[i] = g(i)(i)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((i, (1,i,i,4,(),{})) for i in xrange(8)))
+
+
+class TestMemoizingCurry(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        @curry(memoize=True, maxsize=2)
+        def f(a,b,c=3,*args,**kwargs):
+            self.calls += 1
+            return a,b,c,args,kwargs
+        self.f = f
+
+    def test_different_application_paths_share_cache_entry(self):
+        self.assertEqual(self.f(1)(2, 3), (1,2,3,(),{}))
+        self.assertEqual(self.f(1, 2, c=3), (1,2,3,(),{}))
+        self.assertEqual(self.f(1, 2), (1,2,3,(),{}))
+        self.assertEqual(self.f(a=1)(b=2), (1,2,3,(),{}))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.f.cache_info(), (3, 1, 2, 1))
+
+    def test_extra_arguments_are_part_of_key(self):
+        self.assertEqual(self.f(1, 2, 3, 4, z=5), (1,2,3,(4,),{'z': 5}))
+        self.assertEqual(self.f(1)(2, 3, 4, z=5), (1,2,3,(4,),{'z': 5}))
+        self.assertEqual(self.f(1, 2, 3, 4), (1,2,3,(4,),{}))
+        self.assertEqual(self.calls, 2)
+
+    def test_eviction(self):
+        for a in (1, 2, 3, 1):
+            self.f(a, 0)
+        self.assertEqual(self.calls, 4)
+        self.assertEqual(self.f.cache_info().currsize, 2)
+        self.f.cache_clear()
+        self.assertEqual(self.f.cache_info(), (0, 0, 2, 0))
+
+    def test_partials_are_cached(self):
+        self.assertTrue(self.f(1) is self.f(1))
+        self.assertTrue(self.f(1)(z=1) is self.f(1)(z=1))
+        self.assertEqual(self.f.partial_cache_info().hits, 4)
 
+    def test_unhashable_arguments_are_not_cached(self):
+        self.assertEqual(self.f([1])([2]), ([1],[2],3,(),{}))
+        self.assertEqual(self.f([1], [2]), ([1],[2],3,(),{}))
+        self.assertEqual(self.calls, 2)
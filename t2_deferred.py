@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Deferred initialization built on lazy decorators: lazy imports, lazy decoration of class methods
+and a registry which can warm up everything still pending (e.g. in a background thread after startup),
+so that neither startup nor the first request pays for the heavy setup.
+
+Usage:
+    registry = DeferredRegistry()
+    numpy = lazy_import('numpy', registry)
+
+    @lazy_decorator(jit, registry)
+    def kernel(x):
+        ...
+
+    start_service()
+    registry.warm_up_in_background()
+"""
+from __future__ import division
+from functools import wraps
+from importlib import import_module
+import threading
+import time
+import types
+import unittest
+
+from t2_lazy_decorator import _make_thread_safe_lazy
+
+
+class Deferred(object):
+    """
+    Value computed by initializer exactly once, on the first get(), even if it's called concurrently.
+    Time spent in initializer is kept in seconds.
+    """
+
+    def __init__(self, name, initializer):
+        self.name = name
+        self.seconds = None
+        self._initializer = initializer
+        self._lock = threading.Lock()
+        self._done = False
+        self._value = None
+
+    @property
+    def done(self):
+        return self._done
+
+    def get(self):
+        if self._done:
+            return self._value
+        with self._lock:
+            if not self._done: # checked again, since another thread may have initialized it while we waited
+                started = time.time()
+                self._value = self._initializer()
+                self.seconds = time.time() - started
+                self._done = True
+        return self._value
+
+    def __repr__(self):
+        return '<Deferred {name} ({state})>'.format(name=self.name,
+            state='{:.6f}s'.format(self.seconds) if self._done else 'pending')
+
+
+class DeferredRegistry(object):
+    """
+    Registry of deferred items which can be initialized ahead of their first use.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def register(self, deferred):
+        with self._lock:
+            self._items.append(deferred)
+        return deferred
+
+    def items(self):
+        with self._lock:
+            return list(self._items)
+
+    def pending(self):
+        """
+        Names of the items not initialized yet.
+        """
+        return [item.name for item in self.items() if not item.done]
+
+    def timings(self):
+        """
+        Dict {name: seconds spent on initialization} of the initialized items.
+        """
+        return dict((item.name, item.seconds) for item in self.items() if item.done)
+
+    def warm_up(self):
+        """
+        Initialize all the pending items.
+        An item failing to initialize stays pending (so its first use raises as usual);
+        return list of (name, exception) of such items.
+        """
+        failures = []
+        for item in self.items():
+            if item.done:
+                continue
+            try:
+                item.get()
+            except Exception as exception:
+                failures.append((item.name, exception))
+        return failures
+
+    def warm_up_in_background(self):
+        """
+        Initialize all the pending items in a daemon thread. Return the thread.
+        """
+        thread = threading.Thread(target=self.warm_up, name='deferred-warm-up')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+default_registry = DeferredRegistry()
+
+
+def lazy_decorator(decorator, registry=default_registry, name=None):
+    """
+    Make decorator lazy (see t2_lazy_decorator.make_decorator_lazy with thread_safe=True)
+    and register its application in registry, so it may be applied by warm-up before the first call.
+    """
+    @wraps(decorator)
+    def new_lazy_decorator(f):
+        deferred = registry.register(Deferred(name or '{}.{}'.format(f.__module__, f.__name__),
+            lambda: decorator(f)))
+        return _make_thread_safe_lazy(f, deferred.get)
+    return new_lazy_decorator
+
+
+def decorate_methods_lazily(decorator, registry=default_registry, predicate=None):
+    """
+    Class decorator making decorator lazily applied to each method of the class
+    (plain functions defined in the class, except special methods, satisfying predicate if it's given).
+    """
+    def decorate_class(cls):
+        for attribute, value in list(vars(cls).items()):
+            if not isinstance(value, types.FunctionType) or attribute.startswith('__'):
+                continue
+            if predicate is not None and not predicate(value):
+                continue
+            name = '{}.{}.{}'.format(cls.__module__, cls.__name__, attribute)
+            setattr(cls, attribute, lazy_decorator(decorator, registry, name)(value))
+        return cls
+    return decorate_class
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Module proxy importing the real module on the first attribute access.
+    After import the attributes are copied to the proxy, so further accesses are plain lookups.
+    """
+
+    def __init__(self, name, deferred):
+        super(_LazyModule, self).__init__(name)
+        self.__dict__['_deferred'] = deferred
+
+    def __getattr__(self, attribute):
+        module = self._deferred.get()
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(module_name, registry=default_registry):
+    """
+    Get proxy of module which is imported on the first attribute access (or on warm-up of registry).
+    """
+    deferred = registry.register(Deferred(module_name, lambda: import_module(module_name)))
+    return _LazyModule(module_name, deferred)
+
+
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.registry = DeferredRegistry()
+        self.applied = []
+        def decorator(f):
+            self.applied.append(f.__name__)
+            @wraps(f)
+            def new_decorated_f(*args, **kwargs):
+                return f(*args, **kwargs) * 2
+            return new_decorated_f
+        self.decorator = decorator
+
+
+    def test_lazy_decorator_is_applied_on_first_call(self):
+        @lazy_decorator(self.decorator, self.registry, name='f')
+        def f(x):
+            return x
+        self.assertEqual(self.registry.pending(), ['f'])
+        self.assertEqual(f(2), 4)
+        self.assertEqual(f(3), 6)
+        self.assertEqual(self.applied, ['f'])
+        self.assertEqual(self.registry.pending(), [])
+        self.assertEqual(self.registry.timings().keys(), ['f'])
+
+
+    def test_warm_up_in_background(self):
+        @lazy_decorator(self.decorator, self.registry, name='f')
+        def f(x):
+            return x
+        self.registry.warm_up_in_background().join()
+        self.assertEqual(self.applied, ['f'])
+        self.assertEqual(f(2), 4)
+        self.assertEqual(self.applied, ['f'])
+
+
+    def test_methods_are_decorated_lazily(self):
+        @decorate_methods_lazily(self.decorator, self.registry)
+        class A(object):
+            def __init__(self, x):
+                self.x = x
+            def get(self):
+                return self.x
+            def add(self, y):
+                return self.x + y
+        self.assertEqual(self.applied, [])
+        self.assertEqual(A(3).add(1), 8)
+        self.assertEqual(self.applied, ['add'])
+        self.assertEqual(sorted(self.registry.pending()), [__name__ + '.A.get'])
+
+
+    def test_lazy_import(self):
+        module = lazy_import('json', self.registry)
+        self.assertEqual(self.registry.pending(), ['json'])
+        self.assertEqual(module.dumps([1]), '[1]')
+        self.assertEqual(self.registry.pending(), [])
+        self.assertTrue('loads' in vars(module))
+
+
+    def test_failing_item_stays_pending(self):
+        lazy_import('no_such_module_here', self.registry)
+        failures = self.registry.warm_up()
+        self.assertEqual([name for name, _ in failures], ['no_such_module_here'])
+        self.assertEqual(self.registry.pending(), ['no_such_module_here'])
@@ -1,15 +1,56 @@
 #!/usr/bin/env python
 from __future__ import division
 
-from functools import wraps
+from functools import wraps, update_wrapper
+import sys
+import threading
+import time
 import unittest
 
-def make_decorator_lazy(decorator, apply_on_each_call = False):
+
+def _rebindable_function(target):
+    """
+    Generator yielding function which calls target, the variable of the generator's frame.
+    Sending a new function to the generator rebinds target, so the yielded function calls
+    the new one directly (Python 2 has no nonlocal to rebind a closure variable otherwise).
+    """
+    def call(*args, **kwargs):
+        return target(*args, **kwargs)
+    while True:
+        target = yield call
+
+
+def _make_thread_safe_lazy(f, apply_decorator):
+    """
+    Get function which calls apply_decorator() under lock exactly once, on the first call,
+    and then rebinds itself to call the result directly, without any checks or locks.
+    Calls arriving concurrently with the first one wait for the decorator to be applied.
+    """
+    lock = threading.Lock()
+    lazy_decorated = []
+
+    def apply_once(*args, **kwargs):
+        with lock:
+            if not lazy_decorated: # checked again, since another thread may have applied it while we waited
+                lazy_decorated.append(apply_decorator())
+                rebind.send(lazy_decorated[0])
+        return lazy_decorated[0](*args, **kwargs)
+
+    rebind = _rebindable_function(apply_once)
+    return update_wrapper(next(rebind), f)
+
+
+def make_decorator_lazy(decorator, apply_on_each_call = False, thread_safe = False):
     """
     Make decorator lazy, so that it would be applied right before first run of decorated function.
+
+    thread_safe: apply decorator exactly once even if the first calls are concurrent;
+    after that the calls go straight to the decorated function
     """
     @wraps(decorator)
     def new_lazy_decorator(f):
+        if thread_safe and not apply_on_each_call:
+            return _make_thread_safe_lazy(f, lambda: decorator(f))
         lazy_decorated = []
         @wraps(f)
         def decorated(*args, **kwargs):
@@ -23,14 +64,19 @@ def make_decorator_lazy(decorator, apply_on_each_call = False):
     return new_lazy_decorator
 
 
-def make_decorator_returning_function_returning_lazy_decorator(decorator_factory, apply_on_each_call = False):
+def make_decorator_returning_function_returning_lazy_decorator(decorator_factory, apply_on_each_call = False,
+        thread_safe = False):
     """
     Make function returning decorators return lazy decorators,
     so that each of them would be applied right before first run of decorated function.
+
+    thread_safe: see make_decorator_lazy
     """
     @wraps(decorator_factory)
     def new_factory(*fargs, **fkwargs):
         def new_lazy_decorator(f):
+            if thread_safe and not apply_on_each_call:
+                return _make_thread_safe_lazy(f, lambda: decorator_factory(*fargs, **fkwargs)(f))
             lazy_decorated = []
             @wraps(f)
             def decorated(*args, **kwargs):
@@ -45,6 +91,131 @@ def make_decorator_returning_function_returning_lazy_decorator(decorator_factory
     return new_factory
 
 
+class _Initialization(object):
+    """
+    Computation of function() in a background thread, shared by everybody waiting for its result,
+    so concurrent first callers don't start their own computations.
+    """
+
+    def __init__(self, function):
+        self._function = function
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._started = False
+        self._callbacks = []
+        self._result = None
+        self._exc_info = None
+
+    def start(self):
+        """
+        Start the computation unless it's started already. Doesn't block.
+        """
+        with self._lock:
+            if not self._started:
+                self._started = True
+                thread = threading.Thread(target=self._run, name='lazy-decorator-initialization')
+                thread.daemon = True
+                thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._result = self._function()
+        except: # any exception, including SystemExit and KeyboardInterrupt, so that waiters always wake up
+            self._exc_info = sys.exc_info()
+        with self._lock:
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        return self._finished.is_set()
+
+    def failed(self):
+        return self.done() and self._exc_info is not None
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(self) when the computation finishes (at once, if it has finished already),
+        e.g. to schedule continuation in an event loop instead of blocking it.
+        """
+        with self._lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self, timeout=None):
+        """
+        Start the computation if needed and wait for its result (reraise its exception).
+        """
+        self.start()
+        if not self._finished.wait(timeout):
+            raise RuntimeError("Decorator has not been applied within {timeout} seconds".format(timeout=timeout))
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+def _make_lazy_in_background(f, apply_decorator):
+    """
+    Get function which applies decorator (apply_decorator()) in a background thread.
+    The application is started by the first call or by prepare() of the function, which doesn't block
+    and returns the initialization (see _Initialization) to wait for or to add callbacks to.
+    All the calls made before the decorator is applied wait for the same initialization.
+    Once it succeeds, the function calls the decorated one directly; if it fails, the next call retries.
+    """
+    lock = threading.Lock()
+    current = []
+
+    def rebind_on_success(initialization):
+        if not initialization.failed():
+            rebind.send(initialization.result())
+
+    def prepare():
+        with lock:
+            if not current or current[0].failed():
+                current[:] = [_Initialization(apply_decorator)]
+                current[0].add_done_callback(rebind_on_success)
+            return current[0].start()
+
+    def wait_for_decorated(*args, **kwargs):
+        return prepare().result()(*args, **kwargs)
+
+    rebind = _rebindable_function(wait_for_decorated)
+    decorated = update_wrapper(next(rebind), f)
+    decorated.prepare = prepare
+    return decorated
+
+
+def make_decorator_lazy_in_background(decorator):
+    """
+    Make decorator lazy, so that it would be applied in a background thread, started by the first call
+    of decorated function (which waits for it) or by decorated_function.prepare() (which doesn't wait).
+    Concurrent first calls share one application of decorator.
+
+    The tree targets Python 2, which has no async def and asyncio: an event loop should call prepare()
+    and continue in add_done_callback of the returned initialization instead of blocking on the first call.
+    """
+    @wraps(decorator)
+    def new_lazy_decorator(f):
+        return _make_lazy_in_background(f, lambda: decorator(f))
+    return new_lazy_decorator
+
+
+def make_decorator_returning_function_returning_lazy_decorator_in_background(decorator_factory):
+    """
+    Make function returning decorators return lazy decorators applied in background
+    (see make_decorator_lazy_in_background).
+    """
+    @wraps(decorator_factory)
+    def new_factory(*fargs, **fkwargs):
+        def new_lazy_decorator(f):
+            return _make_lazy_in_background(f, lambda: decorator_factory(*fargs, **fkwargs)(f))
+        return new_lazy_decorator
+    return new_factory
+
 
 class Tests_decorator(unittest.TestCase):
     def setUp(self):
@@ -187,3 +358,132 @@ class Tests_factory(unittest.TestCase):
 
         decorated()
         self.assertEqual(self.cumulative, 2)
+
+
+class Tests_thread_safe(unittest.TestCase):
+    def setUp(self):
+        self.cumulative = 0
+        def slow_decorator(f):
+            time.sleep(0.05)
+            self.cumulative += 1
+            @wraps(f)
+            def new_decorated_f(*args, **kwargs):
+                return f(*args, **kwargs) + 1
+            return new_decorated_f
+        self.decorator = slow_decorator
+
+        def f(x):
+            return x
+        self.f = f
+
+
+    def _call_concurrently(self, decorated):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(decorated(10))) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+
+    def test_decorator_is_applied_once_on_concurrent_first_calls(self):
+        decorated = make_decorator_lazy(self.decorator, thread_safe=True)(self.f)
+        self.assertEqual(self.cumulative, 0)
+        self.assertEqual(decorated.__name__, 'f')
+
+        self.assertEqual(self._call_concurrently(decorated), [11] * 8)
+        self.assertEqual(self.cumulative, 1)
+        self.assertEqual(decorated(1), 2)
+        self.assertEqual(self.cumulative, 1)
+
+
+    def test_factory_is_applied_once_on_concurrent_first_calls(self):
+        factory = lambda option: self.decorator
+        decorated = make_decorator_returning_function_returning_lazy_decorator(factory, thread_safe=True)(10)(self.f)
+        self.assertEqual(self.cumulative, 0)
+
+        self.assertEqual(self._call_concurrently(decorated), [11] * 8)
+        self.assertEqual(self.cumulative, 1)
+
+
+    def test_wrapper_calls_decorated_function_directly_after_first_call(self):
+        decorated = make_decorator_lazy(self.decorator, thread_safe=True)(self.f)
+        decorated(1)
+        target = decorated.func_closure[0].cell_contents
+        self.assertEqual(target.__name__, 'f')
+        self.assertEqual(target(1), 2)
+
+
+class Tests_background(unittest.TestCase):
+    def setUp(self):
+        self.cumulative = 0
+        self.release = threading.Event()
+        def slow_decorator(f):
+            self.release.wait()
+            self.cumulative += 1
+            @wraps(f)
+            def new_decorated_f(*args, **kwargs):
+                return f(*args, **kwargs) + 1
+            return new_decorated_f
+        self.decorator = slow_decorator
+
+        def f(x):
+            return x
+        self.f = f
+
+
+    def test_prepare_does_not_block_and_calls_share_initialization(self):
+        decorated = make_decorator_lazy_in_background(self.decorator)(self.f)
+        initialization = decorated.prepare()
+        self.assertFalse(initialization.done())
+        notified = []
+        notified_event = threading.Event()
+        initialization.add_done_callback(lambda i: notified.append(i) or notified_event.set())
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(decorated(10))) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(decorated.prepare() is initialization)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [11] * 8)
+        self.assertEqual(self.cumulative, 1)
+        notified_event.wait(1) # callbacks run in the background thread after the waiters are released
+        self.assertEqual(notified, [initialization])
+        self.assertEqual(decorated(1), 2)
+        self.assertEqual(decorated.func_closure[0].cell_contents.__name__, 'f') # calls decorated directly
+
+
+    def test_factory(self):
+        self.release.set()
+        factory = lambda option: self.decorator
+        decorated = make_decorator_returning_function_returning_lazy_decorator_in_background(factory)(10)(self.f)
+        self.assertEqual(self.cumulative, 0)
+        self.assertEqual(decorated(1), 2)
+        self.assertEqual(self.cumulative, 1)
+
+
+    def test_failed_application_is_retried(self):
+        attempts = []
+        def failing_once(f):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise IOError("Connection refused")
+            return f
+        decorated = make_decorator_lazy_in_background(failing_once)(self.f)
+        self.assertRaises(IOError, decorated, 1)
+        self.assertEqual(decorated(1), 1)
+        self.assertEqual(len(attempts), 2)
+
+
+    def test_waiters_wake_up_on_base_exception(self):
+        def exiting(f):
+            raise SystemExit(1)
+        decorated = make_decorator_lazy_in_background(exiting)(self.f)
+        initialization = decorated.prepare()
+        self.assertRaises(SystemExit, initialization.result, 5)
+        self.assertTrue(initialization.failed())
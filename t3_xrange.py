@@ -1,12 +1,27 @@
 #!/usr/bin/env python
 from __future__ import division
+from array import array
+from itertools import count, islice, izip, product, takewhile
+from operator import mul
+import sys
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class irange(object):
     """
     Pure Python implementation of xrange.
     Implements slicing and iteration.
+
+    Iteration is delegated to C-level iterators (xrange, or itertools.count for values
+    not fitting into C long), so there is no Python-level overhead per element.
+
+    Bounds may be arbitrary long integers. len() is limited to sys.maxsize as for any sequence,
+    use length attribute to get the exact number of elements of a huge irange.
     """
 
     def __init__(self, *args):
@@ -15,8 +30,8 @@ class irange(object):
         if len(args) < 1:
             raise(TypeError("irange expects at least 1 argument"))
         for arg in args:
-            if not isinstance(arg, int):
-                raise(ValueError("irange accept only arguments of int type. You gave '{arg}'".format(arg=arg)))
+            if not isinstance(arg, (int, long)):
+                raise(ValueError("irange accept only arguments of int or long type. You gave '{arg}'".format(arg=arg)))
 
         if len(args) == 1:
             self._start, self._stop, self._step = 0, args[0], 1
@@ -28,9 +43,48 @@ class irange(object):
         if self._step == 0:
             raise ValueError("Step cannot be equal to 0.")
 
+        # exact integer arithmetic, so that it holds for long bounds as well
+        if self._step > 0:
+            self._length = max(0, (self._stop - self._start + self._step - 1) // self._step)
+        else:
+            self._length = max(0, (self._start - self._stop - self._step - 1) // -self._step)
+
+
+    @property
+    def length(self):
+        """
+        Exact number of elements (may exceed sys.maxsize, unlike len()).
+        """
+        return self._length
+
+
+    def _key(self):
+        """
+        Key identifying the sequence of values: empty ranges are all equal,
+        as well as one-element ranges with different steps.
+        """
+        length = self._length
+        if length == 0:
+            return (0, None, None)
+        if length == 1:
+            return (1, self._start, None)
+        return (length, self._start, self._step)
+
 
     def __hash__(self):
-        return hash(self._slice)
+        return hash(self._key())
+
+
+    def __eq__(self, other):
+        if not isinstance(other, irange):
+            return NotImplemented
+        return self._key() == other._key()
+
+
+    def __ne__(self, other):
+        if not isinstance(other, irange):
+            return NotImplemented
+        return self._key() != other._key()
 
 
     def __repr__(self):
@@ -38,10 +92,7 @@ class irange(object):
 
 
     def __len__(self):
-        if (self._stop - self._start) * (self._step / abs(self._step)) <= 0:
-            return 0
-        else:
-            return 1 + (abs(self._stop - self._start) - 1) // abs(self._step)
+        return self._length
 
 
     def __getitem__(self, index):
@@ -49,14 +100,14 @@ class irange(object):
         # see http://docs.python.org/2/library/functions.html#iter
 
         if isinstance(index, slice):
-            start, stop, step = index.indices(len(self))
-            # slice(...).index(len) produces slice which is equivalent to len elements of intial slice
+            start, stop, step = _slice_indices(index, self._length)
+            # _slice_indices(slice(...), len) produces slice which is equivalent to len elements of intial slice
             return irange(self._get_index_of_ith_element(start), self._get_index_of_ith_element(stop), step*self._step)
 
         if isinstance(index, (int, long)):
-            index =  index + len(self) if index < 0 else index
+            index =  index + self._length if index < 0 else index
 
-            if not 0 <= index < len(self):
+            if not 0 <= index < self._length:
                 raise IndexError('Index {index} out of {self}'.format(index=index, self=self))
 
             return self._get_index_of_ith_element(index)
@@ -67,6 +118,383 @@ class irange(object):
         return self._start + self._step * i
 
 
+    def __iter__(self):
+        return self._iterate(self._start, self._step)
+
+
+    def __reversed__(self):
+        return self._iterate(self._get_index_of_ith_element(self._length - 1), -self._step)
+
+
+    def _iterate(self, first, step):
+        length = self._length
+        try:
+            return iter(xrange(first, first + step * length, step))
+        except OverflowError: # xrange is limited to C long
+            if length <= sys.maxsize:
+                return islice(count(first, step), length)
+            end = first + step * length
+            return takewhile(lambda x: x != end, count(first, step))
+
+
+    def chunks(self, size):
+        """
+        Iterate over consecutive sub-iranges of at most size elements covering the whole irange.
+        Nothing is materialized, so it may be used to hand out parts of a huge range to workers.
+        """
+        if size < 1:
+            raise ValueError("Chunk size must be positive. You gave '{size}'".format(size=size))
+        return (self[i:i + size] for i in _irange_or_xrange(0, self._length, size))
+
+
+    def split(self, parts):
+        """
+        Split irange into list of parts consecutive sub-iranges with lengths differing at most by one.
+        """
+        if parts < 1:
+            raise ValueError("Number of parts must be positive. You gave '{parts}'".format(parts=parts))
+        quotient, remainder = divmod(self._length, parts)
+        bounds = [i * quotient + min(i, remainder) for i in xrange(parts + 1)]
+        return [self[a:b] for a, b in izip(bounds, bounds[1:])]
+
+
+    def _position(self, value):
+        """
+        Index of value in irange or None if it's absent. O(1).
+        """
+        offset = value - self._start
+        if offset % self._step:
+            return None
+        position = offset // self._step
+        return position if 0 <= position < self._length else None
+
+
+    def __contains__(self, value):
+        if isinstance(value, (int, long)):
+            return self._position(value) is not None
+        return any(value == x for x in self)
+
+
+    def index(self, value):
+        """
+        Return index of value. Raise ValueError if the value is not present.
+        """
+        if isinstance(value, (int, long)):
+            position = self._position(value)
+        else:
+            position = next((i for i, x in enumerate(self) if value == x), None)
+        if position is None:
+            raise ValueError('{value} is not in {self}'.format(value=value, self=self))
+        return position
+
+
+    def count(self, value):
+        """
+        Return number of occurrences of value.
+        """
+        if isinstance(value, (int, long)):
+            return int(self._position(value) is not None)
+        return sum(1 for x in self if value == x)
+
+
+    def _ascending_bounds(self):
+        """
+        (lowest element, highest element, absolute step) of non-empty irange.
+        """
+        last = self._get_index_of_ith_element(self._length - 1)
+        return (self._start, last, self._step) if self._step > 0 else (last, self._start, -self._step)
+
+
+    def _in_direction_of_self(self, low, high, step):
+        """
+        irange of low, low + step, ..., high (step > 0) going in the same direction as self.
+        """
+        if self._step > 0:
+            return irange(low, high + 1, step)
+        return irange(high, low - 1, -step)
+
+
+    def _issubset(self, other):
+        length = self._length
+        if length == 0:
+            return True
+        if length == 1:
+            return self._start in other
+        return (self._step % other._step == 0 and self._start in other
+            and self._get_index_of_ith_element(length - 1) in other)
+
+
+    def intersection(self, other):
+        """
+        irange of elements present in both self and other (in the direction of self).
+        Uses Chinese remainder theorem to find the common progression, so it's O(log(step)).
+        """
+        if not self._length or not other._length:
+            return irange(0)
+        low_a, high_a, step_a = self._ascending_bounds()
+        low_b, high_b, step_b = other._ascending_bounds()
+
+        gcd, inverse, _ = _extended_gcd(step_a, step_b)
+        if (low_b - low_a) % gcd:
+            return irange(0)
+        step = step_a // gcd * step_b
+        # low_a + step_a * k == low_b (mod step_b)  =>  k == (low_b - low_a) / gcd * inverse (mod step_b / gcd)
+        k = (low_b - low_a) // gcd * inverse % (step_b // gcd)
+        common = low_a + step_a * k
+
+        low, high = max(low_a, low_b), min(high_a, high_b)
+        low += (common - low) % step
+        if low > high:
+            return irange(0)
+        high -= (high - low) % step
+        return self._in_direction_of_self(low, high, step)
+
+
+    def union(self, other):
+        """
+        irange of elements present in self or other (in the direction of self).
+        Raise ValueError if the union is not an arithmetic progression.
+        """
+        if not other._length:
+            return self[:]
+        if not self._length:
+            return self._in_direction_of_self(*other._ascending_bounds())
+
+        low_a, high_a, _ = self._ascending_bounds()
+        low_b, high_b, _ = other._ascending_bounds()
+        low, high = min(low_a, low_b), max(high_a, high_b)
+        total = self._length + other._length - self.intersection(other)._length
+        # the only candidate is the progression from low to high with total elements
+        step, remainder = divmod(high - low, total - 1) if total > 1 else (1, 0)
+        if not remainder:
+            candidate = irange(low, high + 1, step)
+            if self._issubset(candidate) and other._issubset(candidate):
+                return self._in_direction_of_self(low, high, step)
+        raise ValueError('Union of {self} and {other} is not representable as irange'.format(self=self, other=other))
+
+
+    __and__ = intersection
+    __or__ = union
+
+
+    def to_array(self, typecode='l'):
+        """
+        Get all the elements as array.array of typecode, built in one shot without per-element Python calls.
+        """
+        return array(typecode, iter(self))
+
+
+    def __array__(self, dtype=None):
+        """
+        NumPy array protocol: numpy.asarray(irange(...)) produces numpy.arange of the same elements.
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required to convert irange to numpy array")
+        stop = self._get_index_of_ith_element(self._length)
+        return numpy.arange(self._start, stop, self._step, dtype=dtype)[:self._length]
+
+
+def _extended_gcd(a, b):
+    """
+    Return (g, x, y) such that a*x + b*y == g == gcd(a, b).
+    """
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q, a, b = a // b, b, a % b
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+
+def _slice_indices(index, length):
+    """
+    Same as slice.indices(length), but works for lengths not fitting into C long.
+    """
+    step = 1 if index.step is None else index.step
+    if step == 0:
+        raise ValueError("slice step cannot be zero")
+    lower, upper = (0, length) if step > 0 else (-1, length - 1)
+
+    def normalize(value, default):
+        if value is None:
+            return default
+        if value < 0:
+            return max(value + length, lower)
+        return min(value, upper)
+
+    return normalize(index.start, lower if step > 0 else upper), normalize(index.stop, upper if step > 0 else lower), step
+
+
+def _irange_or_xrange(*args):
+    try:
+        return xrange(*args)
+    except OverflowError:
+        return irange(*args)
+
+
+# axes longer than this are not materialized by irange_nd iteration
+MATERIALIZE_LIMIT = 10**6
+
+
+def _iterate_product(axes):
+    """
+    Same as itertools.product(*axes), which is used as is when all the axes are short.
+    Otherwise the axes up to the last long one are walked lazily and product is used for the short ones after it.
+    """
+    long_axes = [i for i, axis in enumerate(axes) if axis.length > MATERIALIZE_LIMIT]
+    if not long_axes:
+        return product(*axes)
+    split = long_axes[-1] + 1
+    return _walk_product(axes[:split], axes[split:])
+
+
+def _walk_product(head, tail):
+    rest = head[1:]
+    for value in head[0]:
+        prefix = (value,)
+        for suffix in (_walk_product(rest, tail) if rest else product(*tail)):
+            yield prefix + suffix
+
+
+class irange_nd(object):
+    """
+    N-dimensional range: cartesian product of iranges (the last axis changes the fastest).
+    Elements are tuples of coordinates' values, as produced by itertools.product.
+
+    len, indexing by flat index, conversion between flat index and per-axis indices,
+    and membership are O(number of axes); nothing is materialized.
+
+    irange_nd(irange(0, 10, 2), 5, (3, 7)) is a product of irange(0, 10, 2), irange(5) and irange(3, 7).
+    """
+
+    def __init__(self, *axes):
+        if not axes:
+            raise TypeError("irange_nd expects at least 1 axis")
+        self._axes = tuple(self._make_axis(axis) for axis in axes)
+        self._shape = tuple(axis.length for axis in self._axes)
+        self._length = reduce(mul, self._shape, 1)
+        # number of flat positions per one step along each axis
+        strides = [1]
+        for size in reversed(self._shape[1:]):
+            strides.append(strides[-1] * size)
+        self._strides = tuple(reversed(strides))
+
+    @staticmethod
+    def _make_axis(axis):
+        if isinstance(axis, irange):
+            return axis
+        if isinstance(axis, tuple):
+            return irange(*axis)
+        return irange(axis)
+
+    @property
+    def axes(self):
+        return self._axes
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def length(self):
+        """
+        Exact number of elements (may exceed sys.maxsize, unlike len()).
+        """
+        return self._length
+
+    def __len__(self):
+        return self._length
+
+    def __repr__(self):
+        return 'irange_nd({})'.format(', '.join(repr(axis) for axis in self._axes))
+
+    def __eq__(self, other):
+        if not isinstance(other, irange_nd):
+            return NotImplemented
+        if not self._length and not other._length:
+            return True
+        return self._axes == other._axes
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self._axes) if self._length else hash(())
+
+    def coordinates(self, flat_index):
+        """
+        Convert flat index into tuple of indices along each axis.
+        """
+        flat_index = flat_index + self._length if flat_index < 0 else flat_index
+        if not 0 <= flat_index < self._length:
+            raise IndexError('Index {index} out of {self}'.format(index=flat_index, self=self))
+        indices = []
+        for stride in self._strides:
+            index, flat_index = divmod(flat_index, stride)
+            indices.append(index)
+        return tuple(indices)
+
+    def flat_index(self, indices):
+        """
+        Convert tuple of indices along each axis into flat index.
+        """
+        if len(indices) != len(self._axes):
+            raise ValueError('Expected {n} indices, got {indices}'.format(n=len(self._axes), indices=indices))
+        flat = 0
+        for index, size, stride in izip(indices, self._shape, self._strides):
+            index = index + size if index < 0 else index
+            if not 0 <= index < size:
+                raise IndexError('Index {index} out of {self}'.format(index=indices, self=self))
+            flat += index * stride
+        return flat
+
+    def __getitem__(self, index):
+        """
+        self[flat_index] is a tuple of values.
+        self[i, j, ...] with integers is a tuple of values as well,
+        with slices among them it's irange_nd sliced along the axes (axes indexed by integers are dropped).
+        """
+        if isinstance(index, (int, long)):
+            return tuple(axis[i] for axis, i in izip(self._axes, self.coordinates(index)))
+        if isinstance(index, tuple):
+            if len(index) != len(self._axes):
+                raise IndexError('Expected {n} indices, got {index}'.format(n=len(self._axes), index=index))
+            if not any(isinstance(i, slice) for i in index):
+                return tuple(axis[i] for axis, i in izip(self._axes, index))
+            return irange_nd(*[axis[i] for axis, i in izip(self._axes, index) if isinstance(i, slice)])
+        raise TypeError('irange_nd indices must be integers or tuples of integers and slices')
+
+    def __iter__(self):
+        # unlike itertools.product, doesn't materialize long axes
+        return _iterate_product(self._axes)
+
+    def __contains__(self, value):
+        return (isinstance(value, tuple) and len(value) == len(self._axes)
+            and all(v in axis for v, axis in izip(value, self._axes)))
+
+    def index(self, value):
+        """
+        Return flat index of value. Raise ValueError if the value is not present.
+        """
+        if value not in self:
+            raise ValueError('{value} is not in {self}'.format(value=value, self=self))
+        return self.flat_index(tuple(axis.index(v) for v, axis in izip(value, self._axes)))
+
+    def chunks(self, size):
+        """
+        Iterate over iranges of flat indices of at most size elements covering the whole range.
+        Worker gets its elements with self[flat_index] or coordinates with self.coordinates(flat_index).
+        """
+        return irange(self._length).chunks(size)
+
+    def split(self, parts):
+        """
+        Split flat indices into list of parts iranges with lengths differing at most by one.
+        """
+        return irange(self._length).split(parts)
+
+
 class Tests(unittest.TestCase):
 
     def test_one_argument(self):
@@ -108,6 +536,34 @@ class Tests(unittest.TestCase):
     def test_raises_typeerror_on_more_than_three_arguments(self):
         self.assertRaises(TypeError, irange, 10,2,2,1)
 
+    def test_long_bounds(self):
+        big = 2**70
+        r = irange(big, big + 7, 2)
+        self.assertEqual(list(r), [big, big + 2, big + 4, big + 6])
+        self.assertEqual(list(reversed(r)), [big + 6, big + 4, big + 2, big])
+        self.assertEqual(list(r[1:3]), [big + 2, big + 4])
+        self.assertTrue(big + 4 in r)
+
+    def test_exact_length_of_huge_range(self):
+        r = irange(-10**30, 10**30, 3)
+        self.assertEqual(r.length, (2 * 10**30 + 2) // 3)
+        self.assertEqual(r[-1], 10**30 - 2)
+        self.assertEqual(r[10**29], -10**30 + 3 * 10**29)
+        self.assertEqual(r[10**29 + 1:].length, r.length - 10**29 - 1)
+        self.assertRaises(OverflowError, len, r)
+
+    def test_length_matches_xrange(self):
+        for args in [(0, 10, 3), (10, 0, -3), (10, 0, 3), (0, 10, -3), (5, 5), (0, 1, 100), (-7, 8, 5)]:
+            self.assertEqual(len(irange(*args)), len(xrange(*args)))
+
+    def test_chunks_and_split(self):
+        r = irange(3, 50, 4)
+        self.assertEqual([x for chunk in r.chunks(5) for x in chunk], list(r))
+        self.assertEqual([len(chunk) for chunk in r.chunks(5)], [5, 5, 2])
+        self.assertEqual([len(part) for part in r.split(5)], [3, 3, 2, 2, 2])
+        self.assertEqual([x for part in r.split(5) for x in part], list(r))
+        self.assertEqual(irange(10**30).split(3)[2][0], 2 * (10**30 // 3) + 1)
+
     def test_raises_valueerror_on_arguments_other_than_int(self):
         self.assertRaises(ValueError, irange, 10.2)
         self.assertRaises(ValueError, irange, 2, 10.1)
@@ -116,6 +572,105 @@ class Tests(unittest.TestCase):
     def test_raises_valueerror_on_zero_step(self):
         self.assertRaises(ValueError, irange, 2, 10, 0)
 
+    def test_reversed(self):
+        self.assertEqual(list(reversed(irange(2,10,3))), list(reversed(xrange(2,10,3))))
+        self.assertEqual(list(reversed(irange(10,2,-3))), list(reversed(xrange(10,2,-3))))
+        self.assertEqual(list(reversed(irange(10,2))), [])
+
+    def test_to_array(self):
+        self.assertEqual(irange(2,10,2).to_array(), array('l', [2, 4, 6, 8]))
+        self.assertEqual(irange(10,2,2).to_array(), array('l'))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_array(self):
+        self.assertEqual(list(numpy.asarray(irange(10,2,-3))), [10, 7, 4])
+
+    def test_contains(self):
+        r = irange(2, 100, 7)
+        for value in range(-10, 120):
+            self.assertEqual(value in r, value in xrange(2, 100, 7))
+        self.assertTrue(-4 in irange(10, -10, -7))
+        self.assertFalse(-11 in irange(10, -10, -7))
+
+    def test_index_and_count(self):
+        r = irange(10, -10, -3)
+        self.assertEqual(r.index(-5), 5)
+        self.assertEqual(r.count(-5), 1)
+        self.assertEqual(r.count(-6), 0)
+        self.assertRaises(ValueError, r.index, -6)
+
+    def test_equality_and_hash(self):
+        self.assertEqual(irange(0, 10, 3), irange(0, 11, 3))
+        self.assertEqual(irange(5, 5), irange(10, 2))
+        self.assertEqual(irange(5, 6, 2), irange(5, 4, -1))
+        self.assertNotEqual(irange(0, 10, 3), irange(0, 10, 2))
+        self.assertEqual(hash(irange(0, 10, 3)), hash(irange(0, 11, 3)))
+        self.assertEqual(len(set([irange(5, 5), irange(10, 2), irange(3)])), 2)
+
+    def test_intersection(self):
+        for a in [(0, 50, 4), (3, 60, 6), (50, 0, -3), (7, 8), (10, 2)]:
+            for b in [(1, 40, 5), (0, 100, 10), (60, -5, -9), (7, 8), (10, 2)]:
+                expected = [x for x in xrange(*a) if x in xrange(*b)]
+                self.assertEqual(list(irange(*a) & irange(*b)), expected)
+        self.assertEqual(irange(5) & irange(10**30), irange(5))
+        self.assertEqual(irange(10**30) & irange(5), irange(5))
+        self.assertEqual((irange(10**30) & irange(0, 10**30, 7)).length, (10**30 - 1) // 7 + 1)
+
+    def test_union(self):
+        self.assertEqual(irange(0, 10, 2) | irange(1, 10, 2), irange(10))
+        self.assertEqual(irange(0, 10) | irange(5, 20), irange(20))
+        self.assertEqual(irange(0, 30, 6) | irange(0, 30, 3), irange(0, 30, 3))
+        self.assertEqual(irange(0, 1) | irange(7, 8), irange(0, 8, 7))
+        self.assertEqual(list(irange(10, 0, -1) | irange(5, 20)), list(xrange(19, 0, -1)))
+        self.assertRaises(ValueError, irange(0, 10, 2).union, irange(3, 20, 3))
+        self.assertRaises(ValueError, irange(0, 5).union, irange(7, 10))
+        self.assertEqual(irange(5) | irange(10**30), irange(10**30))
+        self.assertEqual(irange(10**30) | irange(5), irange(10**30))
+
+
+
+class Tests_nd(unittest.TestCase):
+
+    def setUp(self):
+        self.axes = [xrange(0, 10, 3), xrange(5), xrange(7, 3, -2)]
+        self.r = irange_nd(irange(0, 10, 3), 5, (7, 3, -2))
+
+    def test_iteration(self):
+        self.assertEqual(list(self.r), list(product(*self.axes)))
+        self.assertEqual(len(self.r), 4 * 5 * 2)
+        self.assertEqual(self.r.shape, (4, 5, 2))
+
+    def test_iteration_is_lazy(self):
+        self.assertEqual(next(iter(irange_nd(10**12, 3))), (0, 0))
+        self.assertEqual(list(islice(irange_nd(10**30, 2), 3)), [(0, 0), (0, 1), (1, 0)])
+        self.assertEqual(list(islice(irange_nd(2, 10**30, (5, 2, -1)), 4)), [(0, 0, 5), (0, 0, 4), (0, 0, 3), (0, 1, 5)])
+        self.assertEqual(list(islice(irange_nd(10**7, 10**7), 2)), [(0, 0), (0, 1)])
+
+    def test_indexing_and_coordinates(self):
+        elements = list(product(*self.axes))
+        for i, element in enumerate(elements):
+            self.assertEqual(self.r[i], element)
+            self.assertEqual(self.r.flat_index(self.r.coordinates(i)), i)
+            self.assertEqual(self.r.index(element), i)
+            self.assertTrue(element in self.r)
+        self.assertEqual(self.r[-1], elements[-1])
+        self.assertRaises(IndexError, lambda: self.r[len(elements)])
+        self.assertFalse((1, 1, 7) in self.r)
+
+    def test_slicing(self):
+        self.assertEqual(self.r[1:3, 2, ::-1], irange_nd(irange(3, 9, 3), irange(5, 8, 2)))
+        self.assertEqual(self.r[1, 2, 1], (3, 2, 5))
+
+    def test_huge_space(self):
+        r = irange_nd(10**10, 10**10, 10**10)
+        self.assertEqual(r.length, 10**30)
+        self.assertEqual(r[10**30 - 1], (10**10 - 1,) * 3)
+        self.assertEqual(r.coordinates(10**20 + 5), (1, 0, 5))
+
+    def test_chunks(self):
+        self.assertEqual([self.r[i] for chunk in self.r.chunks(7) for i in chunk], list(self.r))
+        self.assertEqual([self.r[i] for part in self.r.split(3) for i in part], list(self.r))
+
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+"""
+Running reduce which can be checkpointed to disk and resumed after a crash.
+"""
+from __future__ import division
+from itertools import islice
+from operator import add, mul
+import cPickle as pickle
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class CheckpointedReducer(object):
+    """
+    Running reduce (like ireduce) with its state exposed: accumulated value and number of consumed elements.
+
+    The state may be saved to a snapshot file every every_items consumed elements and/or every every_seconds.
+    A reducer loaded from the snapshot, given the same input from the beginning, skips the elements
+    already consumed and continues from the saved value.
+
+    To keep the loop over the elements tight, the state and the conditions to save a snapshot
+    are updated only once per check_interval elements (and at the end of the input),
+    so value and offset are consistent with each other, but may lag behind the yielded values.
+
+    Usage:
+    reducer = CheckpointedReducer.load_or_create(add, 'sum.snapshot', 0, every_seconds=60)
+    for value in reducer.ireduce(read_records()):
+        ...
+    """
+
+    def __init__(self, function, *initializer, **options):
+        """
+        function: function of two arguments, as in reduce
+        initializer: initial value; if not given, the first element is taken as initial value
+        options:
+            path: snapshot file
+            every_items: save snapshot every every_items elements
+            every_seconds: save snapshot every every_seconds seconds
+            check_interval: number of elements processed between updates of the state
+        """
+        if len(initializer) > 1:
+            raise TypeError("You have provided more than 3 arguments.")
+        self._function = function
+        self._has_value = bool(initializer)
+        self._value = initializer[0] if initializer else None
+        self._offset = 0
+
+        self._path = options.pop('path', None)
+        self._every_items = options.pop('every_items', None)
+        self._every_seconds = options.pop('every_seconds', None)
+        self._check_interval = options.pop('check_interval', 1024)
+        if options:
+            raise TypeError("Unexpected options: {}".format(', '.join(options)))
+        if self._path is None and (self._every_items is not None or self._every_seconds is not None):
+            raise ValueError("Snapshot path is required to save snapshots periodically")
+        if self._check_interval < 1:
+            raise ValueError("Check interval must be positive. You gave '{interval}'".format(
+                interval=self._check_interval))
+        if self._every_items is not None:
+            self._check_interval = min(self._check_interval, self._every_items)
+
+    @property
+    def value(self):
+        """
+        Accumulated value. Raise ValueError if nothing is accumulated yet and there was no initializer.
+        """
+        if not self._has_value:
+            raise ValueError("No value has been accumulated yet")
+        return self._value
+
+    @property
+    def offset(self):
+        """
+        Number of input elements consumed (including the one taken as initial value).
+        """
+        return self._offset
+
+    def snapshot(self):
+        """
+        Get the state as a dict.
+        """
+        return {'value': self._value, 'has_value': self._has_value, 'offset': self._offset}
+
+    def save(self, path=None):
+        """
+        Atomically write the snapshot to path (the snapshot path given on construction by default).
+        """
+        path = self._path if path is None else path
+        if path is None:
+            raise ValueError("Snapshot path is not specified")
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.snapshot')
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                pickle.dump(self.snapshot(), f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temporary_path, path) # atomic on POSIX, so a crash never leaves broken snapshot
+        except:
+            os.remove(temporary_path)
+            raise
+
+    @classmethod
+    def load(cls, function, path, **options):
+        """
+        Create reducer with the state from snapshot at path; options are the same as for constructor.
+        """
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        options.setdefault('path', path)
+        reducer = cls(function, **options)
+        reducer._value = snapshot['value']
+        reducer._has_value = snapshot['has_value']
+        reducer._offset = snapshot['offset']
+        return reducer
+
+    @classmethod
+    def load_or_create(cls, function, path, *initializer, **options):
+        """
+        Load reducer from snapshot at path if it exists, otherwise create a new one saving snapshots to path.
+        """
+        if os.path.exists(path):
+            return cls.load(function, path, **options)
+        return cls(function, *initializer, path=path, **options)
+
+    def ireduce(self, iterable):
+        """
+        Iterator yielding running values, as ireduce does, skipping the elements consumed before.
+        """
+        it = iter(iterable)
+        if self._offset:
+            skipped = sum(1 for _ in islice(it, self._offset))
+            if skipped < self._offset:
+                raise ValueError("Input is shorter than the {offset} elements consumed before".format(
+                    offset=self._offset))
+        return self._ireduce(it)
+
+    def _ireduce(self, it):
+        function = self._function
+        if not self._has_value:
+            try:
+                self._value = next(it)
+            except StopIteration:
+                raise TypeError('ireduce() of empty sequence with no initial value')
+            self._has_value = True
+            self._offset += 1
+
+        accum_value = self._value
+        saved_offset = self._offset
+        saved_time = time.time()
+        while True:
+            consumed = 0
+            for x in islice(it, self._check_interval):
+                accum_value = function(accum_value, x)
+                consumed += 1
+                yield accum_value
+            self._value = accum_value
+            self._offset += consumed
+
+            if self._path is not None:
+                due_by_items = self._every_items is not None and self._offset - saved_offset >= self._every_items
+                due_by_time = self._every_seconds is not None and time.time() - saved_time >= self._every_seconds
+                if consumed < self._check_interval or due_by_items or due_by_time:
+                    self.save()
+                    saved_offset = self._offset
+                    saved_time = time.time()
+            if consumed < self._check_interval:
+                return
+
+
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'reducer.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_values_as_reduce(self):
+        reducer = CheckpointedReducer(mul, 1, check_interval=2)
+        self.assertEqual(list(reducer.ireduce([1,2,3,4,5])), [1, 2, 6, 24, 120])
+        self.assertEqual((reducer.value, reducer.offset), (120, 5))
+
+    def test_resume_after_interruption(self):
+        reducer = CheckpointedReducer(add, path=self.path, every_items=10, check_interval=4)
+        values = reducer.ireduce(xrange(100))
+        for _ in xrange(55):
+            next(values)
+        del values # crash
+
+        resumed = CheckpointedReducer.load(add, self.path)
+        self.assertEqual(resumed.offset, 49) # snapshots are saved at offsets 13, 25, 37, 49
+        self.assertEqual(resumed.value, sum(xrange(49)))
+        self.assertEqual(list(resumed.ireduce(xrange(100)))[-1], sum(xrange(100)))
+        self.assertEqual(CheckpointedReducer.load(add, self.path).offset, 100)
+
+    def test_load_or_create(self):
+        reducer = CheckpointedReducer.load_or_create(add, self.path, 10)
+        self.assertEqual(list(reducer.ireduce([1, 2])), [11, 13])
+        reducer = CheckpointedReducer.load_or_create(add, self.path, 10)
+        self.assertEqual(list(reducer.ireduce([1, 2, 3])), [16])
+
+    def test_should_raise_on_input_shorter_than_offset(self):
+        reducer = CheckpointedReducer(add, 0, path=self.path)
+        list(reducer.ireduce([1, 2, 3]))
+        self.assertRaises(ValueError, CheckpointedReducer.load(add, self.path).ireduce, [1])
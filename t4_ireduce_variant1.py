@@ -1,12 +1,26 @@
 #!/usr/bin/env python
 from __future__ import division
-from operator import mul
+from operator import mul, add
 import unittest
+from array import array
+import t4_parallel_scan
+import t4_vectorized
 
-def ireduce(function, iterable, *initializer):
+def ireduce(function, iterable, *initializer, **options):
     """
     Iterator yielding all values (including intermediate),
     with the last value equal to the output of traditional reduce.
+
+    Options:
+    associative: function is associative (add, mul, max, ...), so the values may be computed
+        by parallel prefix scan (see t4_parallel_scan)
+    workers, threads: parameters of parallel scan, used only with associative=True
+    chunked: yield chunks (lists, or NumPy arrays on vectorized path) of values instead of values
+    chunk_size: number of elements processed at once by parallel scan or chunk-wise accumulation
+
+    When function is a NumPy ufunc, or add, mul applied to floating point numpy.ndarray
+    or array.array, the values are computed by ufunc.accumulate (see t4_vectorized).
+    With chunk_size (and without associative) the input is consumed chunk-wise (see t4_vectorized).
     """
     if len(initializer) > 1:
         raise TypeError("You have provided more than 3 arguments.")
@@ -15,8 +29,42 @@ def ireduce(function, iterable, *initializer):
         initializer = initializer[0]
     else:
         initializer = None
+
+    associative = options.pop('associative', False)
+    chunked = options.pop('chunked', False)
+    chunk_options = dict((name, options.pop(name)) for name in ('chunk_size',) if name in options)
+    scan_options = dict((name, options.pop(name)) for name in ('workers', 'threads') if name in options)
+    if options:
+        raise TypeError("Unexpected options: {}".format(', '.join(options)))
+    if scan_options and not associative:
+        raise TypeError("Options {} may be used only with associative=True".format(', '.join(scan_options)))
+    if associative and chunked:
+        raise TypeError("Chunked output is not supported with associative=True")
+
+    if associative:
+        scan_options.update(chunk_options)
+        return _ireduce_in_parallel(function, iterable, initializer, scan_options)
+    initializers = () if initializer is None else (initializer,)
+    if chunked:
+        return t4_vectorized.accumulate_chunks(function, iterable, *initializers, **chunk_options)
+    if chunk_options or t4_vectorized.is_vectorizable(function, iterable):
+        return t4_vectorized.accumulate(function, iterable, *initializers, **chunk_options)
     return _ireduce(function, iterable, initializer)
 
+def _get_initializer(it, initializer):
+    if initializer is None:
+        try:
+            return next(it)
+        except StopIteration:
+            raise TypeError('ireduce() of empty sequence with no initial value')
+    return initializer
+
+def _ireduce_in_parallel(function, iterable, initializer, scan_options):
+    it = iter(iterable)
+    initializer = _get_initializer(it, initializer)
+    for accum_value in t4_parallel_scan.parallel_scan(function, it, initializer, **scan_options):
+        yield accum_value
+
 def _ireduce(function, iterable, initializer):
     """
     ireduce helper
@@ -28,12 +76,7 @@ def _ireduce(function, iterable, initializer):
     """
 
     it = iter(iterable)
-    if initializer is None:
-        try:
-            initializer = next(it)
-        except StopIteration:
-            raise TypeError('ireduce() of empty sequence with no initial value')
-    accum_value = initializer
+    accum_value = _get_initializer(it, initializer)
     for x in it:
         accum_value = function(accum_value, x)
         yield accum_value
@@ -48,3 +91,28 @@ class Tests(unittest.TestCase):
 
     def test_should_raise_if_less_then_two_parameters(self):
         self.assertRaises(TypeError, ireduce, mul)
+
+    def test_associative(self):
+        self.assertEqual(list(ireduce(add, xrange(100), associative=True, workers=3, chunk_size=7)),
+            list(ireduce(add, xrange(100))))
+
+    def test_should_raise_on_scan_options_without_associative(self):
+        self.assertRaises(TypeError, ireduce, add, [1, 2], workers=2)
+
+    def test_chunked(self):
+        self.assertEqual(list(ireduce(mul, [1,2,3,4,5], 1, chunked=True, chunk_size=2)), [[1, 2], [6, 24], [120]])
+
+    def test_array_input(self):
+        self.assertEqual(list(ireduce(max, array('l', [3, 1, 4, 1, 5]))), [3, 4, 4, 5])
+
+    def test_float_sums_are_identical_to_sequential_reduce(self):
+        values = array('d', (x / 7 for x in xrange(1, 1000)))
+        expected = list(_ireduce(add, values, None))
+        self.assertEqual(list(ireduce(add, values, chunk_size=100)), expected)
+        self.assertEqual(list(ireduce(add, values)), expected)
+
+    def test_chunk_size_on_arbitrary_iterable(self):
+        self.assertEqual(list(ireduce(add, iter(xrange(10)), chunk_size=3)), list(ireduce(add, xrange(10))))
+
+    def test_big_int_products_over_integer_array_are_exact(self):
+        self.assertEqual(list(ireduce(mul, array('l', [2**40] * 3))), [2**80, 2**120])
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 from __future__ import division
-from operator import mul
+from operator import mul, add
 import unittest
+from array import array
+import t4_parallel_scan
+import t4_vectorized
 
 class _Pad(object):
     """
@@ -13,17 +16,47 @@ class _Pad(object):
             cls._pad_instance = super(_Pad, cls).__new__(cls, *args, **kwargs)
         return cls._pad_instance
 
-def ireduce(function, iterable, initializer=_Pad()):
+def ireduce(function, iterable, initializer=_Pad(), **options):
     """
     Iterator yielding all values (including intermediate),
     with the last value equal to the output of traditional reduce.
+
+    Options:
+    associative: function is associative (add, mul, max, ...), so the values may be computed
+        by parallel prefix scan (see t4_parallel_scan)
+    workers, threads: parameters of parallel scan, used only with associative=True
+    chunked: yield chunks (lists, or NumPy arrays on vectorized path) of values instead of values
+    chunk_size: number of elements processed at once by parallel scan or chunk-wise accumulation
+
+    When function is a NumPy ufunc, or add, mul applied to floating point numpy.ndarray
+    or array.array, the values are computed by ufunc.accumulate (see t4_vectorized).
+    With chunk_size (and without associative) the input is consumed chunk-wise (see t4_vectorized).
     """
+    associative = options.pop('associative', False)
+    chunked = options.pop('chunked', False)
+    if associative and chunked:
+        raise TypeError("Chunked output is not supported with associative=True")
+    if not associative and (chunked or 'chunk_size' in options or t4_vectorized.is_vectorizable(function, iterable)):
+        initializers = () if initializer is _Pad() else (initializer,)
+        if chunked:
+            values = t4_vectorized.accumulate_chunks(function, iterable, *initializers, **options)
+        else:
+            values = t4_vectorized.accumulate(function, iterable, *initializers, **options)
+        for value in values:
+            yield value
+        return
     it = iter(iterable)
     if initializer is _Pad():
         try:
             initializer = next(it)
         except StopIteration:
             raise TypeError('ireduce() of empty sequence with no initial value')
+    if associative:
+        for accum_value in t4_parallel_scan.parallel_scan(function, it, initializer, **options):
+            yield accum_value
+        return
+    if options:
+        raise TypeError("Options {} may be used only with associative=True".format(', '.join(options)))
     accum_value = initializer
     for x in it:
         accum_value = function(accum_value, x)
@@ -38,3 +71,25 @@ class Tests(unittest.TestCase):
 
     def test_should_raise_if_less_then_two_parameters(self):
         self.assertRaises(TypeError, ireduce, mul)
+
+    def test_associative(self):
+        self.assertEqual(list(ireduce(add, xrange(100), associative=True, workers=3, chunk_size=7)),
+            list(ireduce(add, xrange(100))))
+
+    def test_chunked(self):
+        self.assertEqual(list(ireduce(mul, [1,2,3,4,5], 1, chunked=True, chunk_size=2)), [[1, 2], [6, 24], [120]])
+
+    def test_array_input(self):
+        self.assertEqual(list(ireduce(max, array('l', [3, 1, 4, 1, 5]))), [3, 4, 4, 5])
+
+    def test_float_sums_are_identical_to_sequential_reduce(self):
+        values = array('d', (x / 7 for x in xrange(1, 1000)))
+        expected = list(ireduce(add, list(values))) # lists are reduced sequentially
+        self.assertEqual(list(ireduce(add, values, chunk_size=100)), expected)
+        self.assertEqual(list(ireduce(add, values)), expected)
+
+    def test_chunk_size_on_arbitrary_iterable(self):
+        self.assertEqual(list(ireduce(add, iter(xrange(10)), chunk_size=3)), list(ireduce(add, xrange(10))))
+
+    def test_big_int_products_over_integer_array_are_exact(self):
+        self.assertEqual(list(ireduce(mul, array('l', [2**40] * 3))), [2**80, 2**120])
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Parallel prefix scan (running reduce) for associative functions.
+
+The input stream is consumed block by block. Each block is split into one chunk per worker and
+1. each chunk is reduced in the pool,
+2. the offsets of the chunks are computed sequentially from the totals of the chunks
+   (only one call of function per chunk),
+3. each chunk is scanned in the pool starting from its offset,
+and the results are yielded in the order of the input.
+
+Only the results of associative functions (add, mul, max, matrix product, ...) are correct,
+since the elements are grouped differently than in a sequential fold.
+"""
+from __future__ import division
+from itertools import islice, izip
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from operator import add, mul
+import unittest
+
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def _reduce_chunk(arguments):
+    function, chunk = arguments
+    return reduce(function, chunk)
+
+
+def _scan_chunk(arguments):
+    function, offset, chunk = arguments
+    result = []
+    accum_value = offset
+    for x in chunk:
+        accum_value = function(accum_value, x)
+        result.append(accum_value)
+    return result
+
+
+def parallel_scan(function, iterator, initializer, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, threads=False):
+    """
+    Iterator yielding function(...function(function(initializer, x0), x1)..., xn) for each element xn
+    of iterator, like the sequential ireduce does, but computed in a pool of workers.
+
+    workers: number of workers (cpu count by default)
+    chunk_size: number of elements processed by one worker at once
+    threads: use pool of threads instead of processes (function must be picklable for processes);
+        worth it only if function releases GIL
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers < 1:
+        raise ValueError("Number of workers must be positive. You gave '{workers}'".format(workers=workers))
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive. You gave '{size}'".format(size=chunk_size))
+    return _parallel_scan(function, iter(iterator), initializer, workers, chunk_size, threads)
+
+
+def _parallel_scan(function, iterator, initializer, workers, chunk_size, threads):
+    pool = ThreadPool(workers) if threads else multiprocessing.Pool(workers)
+    try:
+        carry = initializer
+        while True:
+            block = list(islice(iterator, workers * chunk_size))
+            if not block:
+                return
+            block_chunk_size = -(-len(block) // workers) # ceil, so that all the workers get work
+            chunks = [block[i:i + block_chunk_size] for i in xrange(0, len(block), block_chunk_size)]
+
+            totals = pool.map(_reduce_chunk, [(function, chunk) for chunk in chunks[:-1]])
+            offsets = [carry]
+            for total in totals:
+                offsets.append(function(offsets[-1], total))
+
+            for scanned in pool.imap(_scan_chunk, [(function, offset, chunk)
+                    for offset, chunk in izip(offsets, chunks)]):
+                for value in scanned:
+                    yield value
+            carry = scanned[-1]
+    finally:
+        pool.terminate()
+
+
+class Tests(unittest.TestCase):
+    def test_add_with_processes(self):
+        self.assertEqual(list(parallel_scan(add, iter(xrange(1, 1000)), 0, workers=3, chunk_size=17)),
+            [n * (n + 1) // 2 for n in xrange(1, 1000)])
+
+    def test_mul_with_threads(self):
+        self.assertEqual(list(parallel_scan(mul, [1,2,3,4,5], 1, workers=2, chunk_size=1, threads=True)),
+            [1, 2, 6, 24, 120])
+
+    def test_non_commutative_function_keeps_order(self):
+        self.assertEqual(list(parallel_scan(add, list('abcdefg'), '', workers=3, chunk_size=2, threads=True)),
+            ['a', 'ab', 'abc', 'abcd', 'abcde', 'abcdef', 'abcdefg'])
+
+    def test_max(self):
+        values = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5]
+        self.assertEqual(list(parallel_scan(max, values, 0, workers=4, chunk_size=2)),
+            [3, 3, 4, 4, 5, 9, 9, 9, 9, 9, 9])
+
+    def test_empty(self):
+        self.assertEqual(list(parallel_scan(add, [], 0, workers=2)), [])
+
+    def test_raises_valueerror_on_wrong_number_of_workers(self):
+        self.assertRaises(ValueError, parallel_scan, add, [], 0, workers=0)
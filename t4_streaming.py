@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Streaming reductions next to ireduce: over sliding windows and per key.
+
+Sliding windows use the two-stack queue, so that every element is combined by function
+amortized O(1) times no matter how big the window is. function must be associative
+(it's applied to the elements of the window in their order, but grouped differently).
+"""
+from __future__ import division
+from collections import OrderedDict, deque
+from operator import add, mul
+import unittest
+
+
+class WindowAggregator(object):
+    """
+    FIFO queue of values which keeps the reduction (by associative function) of all its values.
+
+    Values are appended to the back stack, which keeps reduction of all its values.
+    The front stack keeps for each value the reduction of it and all the values appended after it
+    within the stack, so when the oldest value is popped, the reduction of the rest is known at once.
+    When the front stack runs out, the back stack is moved to it.
+    """
+
+    def __init__(self, function):
+        self._function = function
+        self._front = [] # [(value, reduction of this value and newer ones in front)], the oldest at the end
+        self._back = [] # values, the newest at the end
+        self._back_value = None
+
+    def __len__(self):
+        return len(self._front) + len(self._back)
+
+    def append(self, value):
+        self._back_value = value if not self._back else self._function(self._back_value, value)
+        self._back.append(value)
+
+    def popleft(self):
+        """
+        Remove the oldest value and return it.
+        """
+        if not self._front:
+            if not self._back:
+                raise IndexError('popleft from empty WindowAggregator')
+            function = self._function
+            accum_value = None
+            for value in reversed(self._back):
+                accum_value = value if not self._front else function(value, accum_value)
+                self._front.append((value, accum_value))
+            self._back = []
+            self._back_value = None
+        return self._front.pop()[0]
+
+    @property
+    def value(self):
+        """
+        Reduction of all the values in order they were appended.
+        """
+        if not self._front:
+            if not self._back:
+                raise ValueError('Reduction of empty WindowAggregator')
+            return self._back_value
+        if not self._back:
+            return self._front[-1][1]
+        return self._function(self._front[-1][1], self._back_value)
+
+
+def iwindow_reduce(function, iterable, size, partial=True):
+    """
+    Iterator yielding for each element of iterable the reduction of the last size elements.
+
+    partial: yield reductions of the first size - 1 elements as well (otherwise they are skipped)
+    """
+    if size < 1:
+        raise ValueError("Window size must be positive. You gave '{size}'".format(size=size))
+    return _iwindow_reduce(function, iterable, size, partial)
+
+
+def _iwindow_reduce(function, iterable, size, partial):
+    window = WindowAggregator(function)
+    for x in iterable:
+        window.append(x)
+        if len(window) > size:
+            window.popleft()
+        if partial or len(window) == size:
+            yield window.value
+
+
+def itime_window_reduce(function, timestamped_iterable, seconds):
+    """
+    Iterator over (timestamp, reduction of the values with timestamps in (timestamp - seconds, timestamp])
+    for each (timestamp, value) of timestamped_iterable.
+    Timestamps must not decrease; memory is bounded by the number of elements within the window.
+    """
+    if seconds <= 0:
+        raise ValueError("Window length must be positive. You gave '{seconds}'".format(seconds=seconds))
+    return _itime_window_reduce(function, timestamped_iterable, seconds)
+
+
+def _itime_window_reduce(function, timestamped_iterable, seconds):
+    window = WindowAggregator(function)
+    timestamps = deque()
+    previous = None
+    for timestamp, value in timestamped_iterable:
+        if previous is not None and timestamp < previous:
+            raise ValueError("Timestamps must not decrease: {timestamp} after {previous}".format(
+                timestamp=timestamp, previous=previous))
+        previous = timestamp
+        window.append(value)
+        timestamps.append(timestamp)
+        while timestamps[0] <= timestamp - seconds:
+            timestamps.popleft()
+            window.popleft()
+        yield timestamp, window.value
+
+
+def ireduce_by_key(function, iterable, key, initializer=None, max_keys=None):
+    """
+    Iterator over (key(x), running reduction of all the elements with the same key) for each x of iterable.
+
+    initializer: if given, it's the initial value of every key's reduction
+    max_keys: keep at most max_keys running reductions, forgetting the least recently updated ones
+        (a forgotten key starts over), so that memory is bounded for unbounded streams of keys
+    """
+    if max_keys is not None and max_keys < 1:
+        raise ValueError("Maximal number of keys must be positive. You gave '{keys}'".format(keys=max_keys))
+    return _ireduce_by_key(function, iterable, key, initializer, max_keys)
+
+
+def _ireduce_by_key(function, iterable, key, initializer, max_keys):
+    accumulators = OrderedDict() if max_keys is not None else {}
+    for x in iterable:
+        k = key(x)
+        if k in accumulators:
+            accum_value = function(accumulators.pop(k) if max_keys is not None else accumulators[k], x)
+        else:
+            accum_value = x if initializer is None else function(initializer, x)
+        accumulators[k] = accum_value
+        if max_keys is not None and len(accumulators) > max_keys:
+            accumulators.popitem(last=False)
+        yield k, accum_value
+
+
+class Tests(unittest.TestCase):
+    def test_window_aggregator_keeps_order(self):
+        window = WindowAggregator(add)
+        for s in 'abc':
+            window.append(s)
+        self.assertEqual(window.value, 'abc')
+        self.assertEqual(window.popleft(), 'a')
+        window.append('d')
+        self.assertEqual(window.value, 'bcd')
+        self.assertEqual([window.popleft() for _ in xrange(3)], ['b', 'c', 'd'])
+        self.assertRaises(IndexError, window.popleft)
+        self.assertRaises(ValueError, lambda: window.value)
+
+    def test_window_reduce(self):
+        values = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5]
+        self.assertEqual(list(iwindow_reduce(max, values, 3)),
+            [max(values[max(0, i - 2):i + 1]) for i in xrange(len(values))])
+        self.assertEqual(list(iwindow_reduce(add, values, 4, partial=False)),
+            [sum(values[i - 3:i + 1]) for i in xrange(3, len(values))])
+
+    def test_time_window_reduce(self):
+        events = [(0, 1), (1, 2), (1.5, 3), (3, 4), (10, 5)]
+        self.assertEqual(list(itime_window_reduce(add, events, 2)),
+            [(0, 1), (1, 3), (1.5, 6), (3, 7), (10, 5)])
+        self.assertRaises(ValueError, list, itime_window_reduce(add, [(1, 1), (0, 1)], 2))
+
+    def test_reduce_by_key(self):
+        self.assertEqual(list(ireduce_by_key(mul, [1, 2, 3, 4, 5, 6], key=lambda x: x % 2)),
+            [(1, 1), (0, 2), (1, 3), (0, 8), (1, 15), (0, 48)])
+        self.assertEqual(list(ireduce_by_key(add, 'abab', key=str, initializer='>')),
+            [('a', '>a'), ('b', '>b'), ('a', '>aa'), ('b', '>bb')])
+
+    def test_reduce_by_key_with_bounded_number_of_keys(self):
+        self.assertEqual(list(ireduce_by_key(add, [1, 2, 1, 3, 2, 1], key=lambda x: x, max_keys=2)),
+            [(1, 1), (2, 2), (1, 2), (3, 3), (2, 2), (1, 1)])
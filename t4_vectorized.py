@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Chunk-wise running reduce with a vectorized fast path.
+
+The input is consumed in chunks and the running values are produced chunk by chunk.
+When function is a NumPy ufunc, or a known operator (add, mul) applied to floating point
+array input (numpy.ndarray or array.array), every chunk is computed by ufunc.accumulate in C:
+the carry is folded into the first element of the chunk before accumulating, so the operations
+are done in the same order as by sequential reduce and floating point results are identical.
+
+Known operators are vectorized only for floating point arrays: elements of arbitrary iterables
+are Python objects (big integers, strings, ...) and integer arrays yield Python integers, either of which
+mustn't be converted to fixed-width numbers, which overflow silently. Pass a ufunc to opt in explicitly.
+"""
+from __future__ import division
+from array import array
+from itertools import chain, imap, islice
+from operator import add, mul
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# function -> name of NumPy ufunc computing the same
+# (not max and min: numpy.maximum and numpy.minimum propagate NaN, while builtin max and min depend on order)
+_UFUNC_NAMES = {
+    add: 'add',
+    mul: 'multiply',
+}
+
+
+def get_ufunc(function):
+    """
+    Get NumPy ufunc equivalent to function or None if there is no such (or NumPy is not installed).
+    """
+    if numpy is None:
+        return None
+    if isinstance(function, numpy.ufunc):
+        return function
+    name = _UFUNC_NAMES.get(function)
+    return None if name is None else getattr(numpy, name)
+
+
+def is_vectorizable(function, iterable):
+    """
+    Whether running reduce of function over iterable may be done by ufunc.accumulate.
+    """
+    ufunc = get_ufunc(function)
+    if ufunc is None:
+        return False
+    return isinstance(function, numpy.ufunc) or _is_floating_array(iterable)
+
+
+def _is_floating_array(iterable):
+    if isinstance(iterable, array):
+        return iterable.typecode in 'fd'
+    return isinstance(iterable, numpy.ndarray) and iterable.dtype.kind == 'f'
+
+
+def accumulate_chunks(function, iterable, *initializer, **options):
+    """
+    Iterator over chunks of running values of function over iterable:
+    concatenated, they are the values yielded by ireduce(function, iterable, *initializer).
+    Chunks are NumPy arrays on vectorized path and lists otherwise.
+
+    chunk_size: number of elements consumed at once
+    """
+    chunk_size = options.pop('chunk_size', DEFAULT_CHUNK_SIZE)
+    if options:
+        raise TypeError("Unexpected options: {}".format(', '.join(options)))
+    if len(initializer) > 1:
+        raise TypeError("You have provided more than 3 arguments.")
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive. You gave '{size}'".format(size=chunk_size))
+
+    if is_vectorizable(function, iterable):
+        ufunc = get_ufunc(function)
+        if isinstance(iterable, (numpy.ndarray, array)):
+            values = numpy.asarray(iterable)
+            chunks = (values[i:i + chunk_size] for i in xrange(0, len(values), chunk_size))
+        else:
+            it = iter(iterable)
+            chunks = (numpy.asarray(chunk) for chunk in iter(lambda: list(islice(it, chunk_size)), []))
+        accumulate_chunk = lambda carry, chunk: _accumulate_array(ufunc, carry, chunk)
+    else:
+        it = iter(iterable)
+        chunks = iter(lambda: list(islice(it, chunk_size)), [])
+        accumulate_chunk = lambda carry, chunk: _accumulate_list(function, carry, chunk)
+    return _accumulate_chunks(accumulate_chunk, chunks, initializer)
+
+
+def _accumulate_array(ufunc, carry, chunk):
+    chunk = numpy.array(chunk, dtype=numpy.result_type(carry, chunk)) # a copy, since it's modified
+    chunk[0] = ufunc(carry, chunk[0])
+    return ufunc.accumulate(chunk)
+
+
+def _accumulate_list(function, carry, chunk):
+    result = []
+    append = result.append
+    for x in chunk:
+        carry = function(carry, x)
+        append(carry)
+    return result
+
+
+def _accumulate_chunks(accumulate_chunk, chunks, initializer):
+    if initializer:
+        carry = initializer[0]
+    else:
+        chunk = next(chunks, None)
+        if chunk is None or not len(chunk):
+            raise TypeError('ireduce() of empty sequence with no initial value')
+        carry, chunk = chunk[0], chunk[1:]
+        if len(chunk):
+            chunks = chain([chunk], chunks)
+    for chunk in chunks:
+        result = accumulate_chunk(carry, chunk)
+        yield result
+        carry = result[-1]
+
+
+def accumulate(function, iterable, *initializer, **options):
+    """
+    Same values as ireduce(function, iterable, *initializer), computed chunk-wise by accumulate_chunks.
+    """
+    chunks = accumulate_chunks(function, iterable, *initializer, **options)
+    return chain.from_iterable(imap(_to_list, chunks))
+
+
+def _to_list(chunk):
+    return chunk if isinstance(chunk, list) else chunk.tolist()
+
+
+class Tests(unittest.TestCase):
+    def test_lists(self):
+        self.assertEqual(list(accumulate_chunks(mul, [1,2,3,4,5], 1, chunk_size=2)), [[1, 2], [6, 24], [120]])
+        self.assertEqual(list(accumulate(mul, [1,2,3,4,5], chunk_size=2)), [2, 6, 24, 120])
+
+    def test_array_without_initializer(self):
+        self.assertEqual(list(accumulate(add, array('l', range(10)), chunk_size=3)),
+            [1, 3, 6, 10, 15, 21, 28, 36, 45])
+
+    def test_should_raise_on_empty_sequence_without_initializer(self):
+        self.assertRaises(TypeError, list, accumulate_chunks(add, []))
+        self.assertEqual(list(accumulate_chunks(add, [], 0)), [])
+
+    def test_python_objects_are_not_vectorized(self):
+        self.assertFalse(is_vectorizable(add, [1, 2]))
+        self.assertEqual(list(accumulate(mul, [2**40] * 3)), [2**80, 2**120])
+
+    def test_integer_arrays_are_not_vectorized(self):
+        self.assertFalse(is_vectorizable(mul, array('l', [1, 2])))
+        self.assertEqual(list(accumulate(mul, array('l', [2**40] * 3))), [2**80, 2**120])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_floating_point_results_are_identical_to_sequential_reduce(self):
+        values = array('d', (x / 7 for x in xrange(1, 1000)))
+        vectorized = list(accumulate(add, values, 0.1, chunk_size=64))
+        self.assertEqual(vectorized, _accumulate_list(add, 0.1, values))
+        self.assertEqual(list(accumulate(add, values, chunk_size=64)), _accumulate_list(add, values[0], values[1:]))
+
+    def test_max_is_not_vectorized(self):
+        nan = float('nan')
+        self.assertFalse(is_vectorizable(max, array('d', [1.0])))
+        self.assertEqual(list(accumulate(max, array('d', [1.0, nan, 2.0]))), [1.0, 2.0])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_floating_arrays_are_vectorized(self):
+        self.assertTrue(is_vectorizable(add, array('d', [1.5])))
+        self.assertTrue(is_vectorizable(add, numpy.ones(2)))
+        self.assertFalse(is_vectorizable(add, numpy.arange(2)))
+        self.assertEqual(list(accumulate(add, array('d', [0.5] * 4), chunk_size=3)), [1.0, 1.5, 2.0])
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_ufunc_on_ndarray(self):
+        values = numpy.arange(1, 11)
+        chunks = list(accumulate_chunks(numpy.maximum, values[::-1], chunk_size=4))
+        self.assertTrue(all(isinstance(chunk, numpy.ndarray) for chunk in chunks))
+        self.assertEqual(list(numpy.concatenate(chunks)), [10] * 9)
+        self.assertEqual(list(accumulate(numpy.add, iter(range(5)), 10, chunk_size=2)), [10, 11, 13, 16, 20])
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+Benchmark and cross-validation of prime generators from t5_eratosthenes.
+
+For every engine and every workload it measures throughput (primes per second)
+and peak memory, and checks that all the engines produced the same primes.
+Each measurement is run in a separate process, so peak memory of one engine is not
+polluted by another one.
+
+Usage:
+    python t5_benchmark.py --counts 4 5 6 7 --bounds 4 5 6 7 --output result.json
+
+Workloads are given as powers of ten:
+    --counts: first 10**k primes
+    --bounds: all primes below 10**k
+"""
+from __future__ import division
+import argparse
+import json
+import multiprocessing
+import os
+import Queue
+import resource
+import signal
+import sys
+import time
+from itertools import islice, takewhile
+import unittest
+
+import t5_eratosthenes
+
+
+def _primes_below_from_table(bound):
+    table = t5_eratosthenes.smallest_prime_factor_table(max(1, bound - 1))
+    return (n for n in xrange(2, bound) if table[n] == n)
+
+
+# engine name -> function returning infinite prime generator
+UNBOUNDED_ENGINES = {
+    'efficient_primes': t5_eratosthenes.efficient_primes,
+    'expanded_oneliner': t5_eratosthenes.expanded_oneliner,
+    'one_liner': t5_eratosthenes.one_liner,
+}
+
+# engine name -> function returning generator of primes below bound
+BOUNDED_ENGINES = dict(
+    ((name, (lambda engine: lambda bound: takewhile(lambda p: p < bound, engine()))(engine))
+        for name, engine in UNBOUNDED_ENGINES.iteritems()),
+    spf_table=_primes_below_from_table,
+)
+
+
+def _get_primes(engine, kind, size):
+    if kind == 'count':
+        return islice(UNBOUNDED_ENGINES[engine](), size)
+    elif kind == 'bound':
+        return BOUNDED_ENGINES[engine](size)
+    else:
+        raise ValueError("Unknown workload kind '{kind}'".format(kind=kind))
+
+
+def _peak_memory_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak # bytes on Mac OS X, kilobytes elsewhere
+
+
+def measure(engine, kind, size):
+    """
+    Run engine on workload in the current process.
+    Return dict with timing, memory and a fingerprint of produced primes.
+    """
+    memory_before = _peak_memory_kb()
+    started = time.time()
+    number, total, last = 0, 0, None
+    for p in _get_primes(engine, kind, size):
+        number += 1
+        total += p
+        last = p
+    elapsed = time.time() - started
+    return {
+        'engine': engine,
+        'kind': kind,
+        'size': size,
+        'seconds': elapsed,
+        'primes': number,
+        'primes_per_second': number / elapsed if elapsed else None,
+        'peak_memory_kb': _peak_memory_kb(),
+        'baseline_memory_kb': memory_before,
+        'fingerprint': [number, total, last],
+        'failed': False,
+    }
+
+
+def _failed_result(engine, kind, size, error):
+    return {'engine': engine, 'kind': kind, 'size': size, 'failed': True, 'error': error}
+
+
+def _measure_into_queue(queue, engine, kind, size):
+    try:
+        result = measure(engine, kind, size)
+    except Exception as exception:
+        result = _failed_result(engine, kind, size, '{}: {}'.format(type(exception).__name__, exception))
+    queue.put(result)
+
+
+_POLL_INTERVAL = 0.5 # seconds
+
+
+def measure_in_subprocess(engine, kind, size, timeout=None):
+    """
+    Same as measure, but run in a fresh process so that peak memory belongs to this run only.
+    If the process fails, dies (e.g. killed on running out of memory) or doesn't finish
+    within timeout seconds, a failed result (with 'failed' set and 'error' describing the failure) is returned.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_into_queue, args=(queue, engine, kind, size))
+    started = time.time()
+    process.start()
+    try:
+        while True:
+            try:
+                return queue.get(timeout=_POLL_INTERVAL)
+            except Queue.Empty:
+                pass
+            if not process.is_alive():
+                try:
+                    return queue.get(timeout=_POLL_INTERVAL) # the result may still be in transit
+                except Queue.Empty:
+                    process.join()
+                    return _failed_result(engine, kind, size,
+                        'Process exited with code {code}'.format(code=process.exitcode))
+            if timeout is not None and time.time() - started > timeout:
+                return _failed_result(engine, kind, size, 'Timed out after {timeout} seconds'.format(timeout=timeout))
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def run(counts=(), bounds=(), engines=None, isolate=True, timeout=None):
+    """
+    Measure all the engines on all the workloads and cross-validate them.
+
+    counts: sizes of 'first n primes' workloads
+    bounds: sizes of 'primes below n' workloads
+    engines: names of engines to use (all applicable ones by default)
+    isolate: run each measurement in a separate process
+    timeout: seconds given to each isolated measurement
+
+    Return dict ready to be dumped to JSON.
+    """
+    if isolate:
+        measure_function = lambda name, kind, size: measure_in_subprocess(name, kind, size, timeout)
+    else:
+        measure_function = measure
+    workloads = [('count', size, UNBOUNDED_ENGINES) for size in counts] + \
+                [('bound', size, BOUNDED_ENGINES) for size in bounds]
+    report = {'workloads': [], 'consistent': True, 'failed': False}
+    for kind, size, available in workloads:
+        names = sorted(name for name in available if engines is None or name in engines)
+        results = [measure_function(name, kind, size) for name in names]
+        succeeded = [result for result in results if not result['failed']]
+        consistent = len(set(tuple(result['fingerprint']) for result in succeeded)) <= 1
+        report['consistent'] = report['consistent'] and consistent
+        report['failed'] = report['failed'] or len(succeeded) < len(results)
+        report['workloads'].append({'kind': kind, 'size': size, 'consistent': consistent, 'results': results})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark prime generators from t5_eratosthenes.')
+    parser.add_argument('--counts', type=int, nargs='*', default=[4, 5, 6, 7], metavar='K',
+        help='measure generation of the first 10**K primes')
+    parser.add_argument('--bounds', type=int, nargs='*', default=[4, 5, 6, 7], metavar='K',
+        help='measure generation of the primes below 10**K')
+    parser.add_argument('--engines', nargs='*', default=None,
+        help='engines to measure (all by default): {}'.format(', '.join(sorted(BOUNDED_ENGINES))))
+    parser.add_argument('--timeout', type=float, default=None,
+        help='seconds given to each measurement (unlimited by default)')
+    parser.add_argument('--output', default=None, help='file to write JSON report to (stdout by default)')
+    arguments = parser.parse_args(argv)
+
+    report = run(counts=[10**k for k in arguments.counts], bounds=[10**k for k in arguments.bounds],
+        engines=arguments.engines, timeout=arguments.timeout)
+    if arguments.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(arguments.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['consistent'] and not report['failed'] else 1
+
+
+class Tests(unittest.TestCase):
+    def test_engines_are_consistent_on_counts(self):
+        report = run(counts=[1000], isolate=False)
+        self.assertTrue(report['consistent'])
+        self.assertEqual(len(report['workloads'][0]['results']), len(UNBOUNDED_ENGINES))
+        self.assertEqual(report['workloads'][0]['results'][0]['fingerprint'][0], 1000)
+
+    def test_engines_are_consistent_on_bounds(self):
+        report = run(bounds=[1000], isolate=False)
+        self.assertTrue(report['consistent'])
+        self.assertEqual(len(report['workloads'][0]['results']), len(BOUNDED_ENGINES))
+        self.assertEqual(report['workloads'][0]['results'][0]['fingerprint'][0], 168)
+
+    def test_failures_in_subprocess_are_reported(self):
+        result = measure_in_subprocess('efficient_primes', 'unknown kind', 10)
+        self.assertTrue(result['failed'])
+        self.assertTrue(result['error'].startswith('ValueError'))
+        result = measure_in_subprocess('one_liner', 'count', 10**9, timeout=1)
+        self.assertTrue(result['failed'])
+        self.assertTrue(result['error'].startswith('Timed out'))
+
+    def test_killed_subprocess_is_reported(self):
+        global measure
+        original = measure
+        measure = lambda *args: os.kill(os.getpid(), signal.SIGKILL) # as on running out of memory
+        try:
+            result = measure_in_subprocess('one_liner', 'count', 10)
+        finally:
+            measure = original
+        self.assertEqual((result['failed'], result['error']), (True, 'Process exited with code -9'))
+
+    def test_report_is_serializable(self):
+        report = run(counts=[10], engines=['efficient_primes'])
+        self.assertEqual(json.loads(json.dumps(report))['workloads'][0]['results'][0]['primes'], 10)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
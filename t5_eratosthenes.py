@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 from __future__ import division
-from itertools import islice, count, chain, ifilter
+from array import array
+from itertools import islice, count, chain, ifilter, takewhile, izip
+from operator import mul
 import unittest
 
 def efficient_primes():
@@ -86,6 +88,99 @@ one_liner = lambda: (\
     ).next()
 
 
+_DEFAULT_SPF_BOUND = 10**7
+
+
+def smallest_prime_factor_table(bound):
+    """
+    Build table of smallest prime factors for all the numbers up to bound (inclusive).
+    table[n] is the smallest prime dividing n (table[p] == p for primes, table[0] == 0, table[1] == 1).
+
+    The table is stored as a compact array('l') rather than a list of Python ints.
+    Sieving primes are taken from efficient_primes and processed in descending order,
+    so that marking all the multiples of p is a single slice assignment done in C
+    and smaller primes overwrite the marks of bigger ones.
+    """
+    if bound < 1:
+        raise ValueError("Bound must be positive. You gave '{bound}'".format(bound=bound))
+    table = array('l', xrange(bound + 1))
+    sieving_primes = list(takewhile(lambda p: p*p <= bound, efficient_primes()))
+    for p in reversed(sieving_primes):
+        multiples = len(xrange(p*p, bound + 1, p))
+        table[p*p::p] = array('l', [p]) * multiples
+    return table
+
+
+class _StreamedPrimes(object):
+    """
+    List of primes extended on demand from efficient_primes.
+    Shared between the numbers of one batch, so primes are generated only once.
+    """
+    def __init__(self):
+        self._primes = []
+        self._generator = efficient_primes()
+
+    def up_to_square_root(self, n):
+        """
+        Iterate over primes p with p*p <= n.
+        """
+        for p in self._primes:
+            if p*p > n:
+                return
+            yield p
+        for p in self._generator:
+            self._primes.append(p)
+            if p*p > n:
+                return
+            yield p
+
+
+def _factorize_with_table(n, table, streamed_primes):
+    bound = len(table) - 1
+    factors = []
+    if n > bound:
+        for p in streamed_primes.up_to_square_root(n):
+            while n % p == 0:
+                factors.append(p)
+                n //= p
+            if n <= bound or p*p > n:
+                break
+        if n > bound: # no factors up to square root left, so n is prime
+            factors.append(n)
+            return factors
+    while n > 1:
+        p = table[n]
+        factors.append(p)
+        n //= p
+    return factors
+
+
+def factorize_many(ints, table=None):
+    """
+    Iterator over lists of prime factors (with multiplicity, ascending) of each number in ints.
+
+    Numbers up to the bound of the table are factorized by lookups in smallest prime factor table,
+    bigger numbers are reduced by trial division with primes streamed from efficient_primes
+    until they fit into the table.
+
+    table: table built by smallest_prime_factor_table; if not provided,
+    it is built once for the whole batch up to max(ints) (but not above _DEFAULT_SPF_BOUND).
+    """
+    if table is None:
+        ints = list(ints)
+        if not ints:
+            return iter([])
+        table = smallest_prime_factor_table(max(1, min(max(ints), _DEFAULT_SPF_BOUND)))
+    return _factorize_many(ints, table)
+
+
+def _factorize_many(ints, table):
+    streamed_primes = _StreamedPrimes()
+    for n in ints:
+        if n < 1:
+            raise ValueError("Only positive numbers can be factorized. You gave '{n}'".format(n=n))
+        yield _factorize_with_table(n, table, streamed_primes)
+
 
 class Tests(unittest.TestCase):
     def test_efficient_primes(self):
@@ -95,3 +190,23 @@ class Tests(unittest.TestCase):
     def test_one_liner(self):
         self.assertEqual(list(islice(one_liner(),0,20)),
             [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71])
+
+    def test_smallest_prime_factor_table(self):
+        self.assertEqual(list(smallest_prime_factor_table(16)),
+            [0, 1, 2, 3, 2, 5, 2, 7, 2, 3, 2, 11, 2, 13, 2, 3, 2])
+
+    def test_factorize_many(self):
+        self.assertEqual(list(factorize_many([1, 2, 12, 97, 360, 1001])),
+            [[], [2], [2, 2, 3], [97], [2, 2, 2, 3, 3, 5], [7, 11, 13]])
+
+    def test_factorize_many_above_table_bound(self):
+        table = smallest_prime_factor_table(100)
+        numbers = [101, 2*3*1009, 1009*1013, 2**20, 999983*7]
+        for n, factors in izip(numbers, factorize_many(numbers, table)):
+            self.assertEqual(reduce(mul, factors, 1), n)
+            self.assertEqual(factors, sorted(factors))
+        self.assertEqual(list(factorize_many(numbers, table)),
+            [[101], [2, 3, 1009], [1009, 1013], [2]*20, [7, 999983]])
+
+    def test_factorize_many_raises_valueerror_on_nonpositive(self):
+        self.assertRaises(ValueError, list, factorize_many([0]))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of infix operators from t6_infix_operator_a against direct function calls.
+
+Usage:
+    python t6_benchmark.py [--number N]
+"""
+from __future__ import division
+import argparse
+import timeit
+import unittest
+
+SETUP = '''
+from operator import add
+from t6_infix_operator_a import make_infix
+plus = make_infix(add)
+left_list, right_list = [1], [2]
+'''
+
+# name -> statement
+CASES = [
+    ('direct call', 'add(1, 2)'),
+    ('int |op| int', '1 |plus| 2'),
+    ('int <<op>> int', '1 <<plus>> 2'),
+    ('list |op| list', 'left_list |plus| right_list'),
+    ('direct call on lists', 'add(left_list, right_list)'),
+]
+
+
+def run(number=1000000, repeat=3):
+    """
+    Return list of (case name, best time per operation in microseconds).
+    """
+    return [(name, min(timeit.repeat(statement, SETUP, repeat=repeat, number=number)) / number * 1e6)
+        for name, statement in CASES]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark infix operators against direct calls.')
+    parser.add_argument('--number', type=int, default=1000000, help='number of operations per measurement')
+    arguments = parser.parse_args(argv)
+    for name, microseconds in run(arguments.number):
+        print('{name:<24}{microseconds:8.3f} usec'.format(name=name, microseconds=microseconds))
+
+
+class Tests(unittest.TestCase):
+    def test_run(self):
+        self.assertEqual([name for name, _ in run(number=10, repeat=1)], [name for name, _ in CASES])
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,23 @@
 from __future__ import division
 
 import itertools
-from operator import mul
+from operator import mul, add
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Partial applications for left arguments of these types are cached per type
+# (1, 1L and True are equal, but must stay distinguishable); floats are not cached, since 0.0 == -0.0.
+_CACHED_LEFT_TYPES = (int, long, bool, str, unicode)
+_MAX_CACHED_PARTIALS = 1024
+
+
 class PartiallyAppliedInfix(object):
+    __slots__ = ('f', 'left_argument')
+
     def __init__(self, f, left_argument):
         self.f = f
         self.left_argument = left_argument
@@ -13,21 +26,171 @@ class PartiallyAppliedInfix(object):
     def __or__(self, right_argument):
         return self.f(self.left_argument, right_argument)
 
+    __rshift__ = __or__
+
 
 class Infix(object):
+    """
+    Infix operator: a |infix| b or a <<infix>> b is f(a, b).
+    (Python 2 has no @ operator, so matrix-multiplication-like syntax is not available.)
+    """
+    __slots__ = ('f', '_partials')
+    __array_ufunc__ = None # make NumPy arrays defer "array | operator" to __ror__ instead of broadcasting
+
     def __init__(self, f):
         self.f = f
+        self._partials = dict((left_type, {}) for left_type in _CACHED_LEFT_TYPES)
+
+    def __ror__(self, left_argument):
+        partials = self._partials.get(type(left_argument))
+        if partials is None:
+            return PartiallyAppliedInfix(self.f, left_argument)
+        try:
+            return partials[left_argument]
+        except KeyError:
+            if len(partials) >= _MAX_CACHED_PARTIALS:
+                partials.clear()
+            partial = partials[left_argument] = PartiallyAppliedInfix(self.f, left_argument)
+            return partial
+
+    __rlshift__ = __ror__
+
+
+class Expression(object):
+    """
+    Node of deferred expression tree built by deferred infix operators.
+    Call evaluate() to get its value.
+    """
+    _key = None
+
+    def key(self):
+        """
+        Structural key: equal for equal subexpressions over the same (identical) operands.
+        """
+        if self._key is None:
+            self._key = self._make_key()
+        return self._key
+
+    def evaluate(self):
+        return evaluate(self)
+
+
+class Leaf(Expression):
+    def __init__(self, value):
+        self.value = value
+
+    def _make_key(self):
+        return ('leaf', id(self.value))
+
+
+class Application(Expression):
+    def __init__(self, infix, left, right):
+        self.infix = infix
+        self.left = left if isinstance(left, Expression) else Leaf(left)
+        self.right = right if isinstance(right, Expression) else Leaf(right)
+
+    def _make_key(self):
+        return (id(self.infix), self.left.key(), self.right.key())
+
+
+class PartiallyAppliedDeferredInfix(object):
+    __slots__ = ('infix', 'left_argument')
+
+    def __init__(self, infix, left_argument):
+        self.infix = infix
+        self.left_argument = left_argument
+
+    def __or__(self, right_argument):
+        return Application(self.infix, self.left_argument, right_argument)
+
+    __rshift__ = __or__
+
+
+class DeferredInfix(object):
+    """
+    Infix operator building expression tree instead of calling f at once.
+
+    elementwise: function of two elements, if f(x, y) is [elementwise(a, b) for a, b in izip(x, y)];
+    chains of such operators are fused into a single pass over their operands
+    (or a NumPy expression, if all the operands are arrays and elementwise functions are ufuncs).
+    """
+    __slots__ = ('f', 'elementwise')
+    __array_ufunc__ = None
+
+    def __init__(self, f, elementwise=None):
+        self.f = f
+        self.elementwise = elementwise
 
     def __ror__(self, left_argument):
-        return PartiallyAppliedInfix(self.f, left_argument)
+        return PartiallyAppliedDeferredInfix(self, left_argument)
+
+    __rlshift__ = __ror__
+
+
+def evaluate(expression):
+    """
+    Evaluate expression tree: each distinct subexpression is evaluated once,
+    chains of elementwise operators are fused.
+    """
+    if not isinstance(expression, Expression):
+        return expression
+    return _evaluate(expression, {})
+
+
+def _evaluate(node, cache):
+    key = node.key()
+    if key in cache:
+        return cache[key]
+    if isinstance(node, Leaf):
+        result = node.value
+    elif node.infix.elementwise is not None:
+        result = _evaluate_fused(node, cache)
+    else:
+        result = node.infix.f(_evaluate(node.left, cache), _evaluate(node.right, cache))
+    cache[key] = result
+    return result
+
+
+def _evaluate_fused(node, cache):
+    """
+    Evaluate the maximal subtree of elementwise operators rooted at node in a single pass.
+    """
+    namespace = {}
+    operands = [] # values of distinct operands of the subtree
+    operand_names = {} # key -> name of argument of the fused function
+
+    def build(node):
+        if isinstance(node, Application) and node.infix.elementwise is not None:
+            name = 'f{}'.format(id(node.infix.elementwise))
+            namespace[name] = node.infix.elementwise
+            return '{}({}, {})'.format(name, build(node.left), build(node.right))
+        key = node.key()
+        if key not in operand_names:
+            operand_names[key] = 'x{}'.format(len(operands))
+            operands.append(_evaluate(node, cache))
+        return operand_names[key]
+
+    body = build(node)
+    arguments = ', '.join('x{}'.format(i) for i in xrange(len(operands)))
+    if numpy is not None and all(isinstance(operand, numpy.ndarray) for operand in operands) \
+            and all(isinstance(function, numpy.ufunc) for function in namespace.itervalues()):
+        namespace.update(('x{}'.format(i), operand) for i, operand in enumerate(operands))
+        return eval(body, namespace)
+    fused = eval('lambda {}: {}'.format(arguments, body), namespace)
+    return list(itertools.imap(fused, *operands))
 
 
-def make_infix(f):
+def make_infix(f, deferred=False, elementwise=None):
     """
     Make function possible to be used this way:
     i_f = make_infix(f)
-    f(a,b) <=> a |i_f| b
+    f(a,b) <=> a |i_f| b <=> a <<i_f>> b
+
+    With deferred=True, a |i_f| b builds expression tree, which is computed by evaluate(tree),
+    see DeferredInfix for the meaning of elementwise.
     """
+    if deferred:
+        return DeferredInfix(f, elementwise)
     return Infix(f)
 
 
@@ -53,6 +216,77 @@ class Tests(unittest.TestCase):
         C = [7, 8, 9, 10, 11]
         self.assertEqual(A |self.cross| B |self.cross| C, self.cross_product(self.cross_product(A,B),C))
 
+    def test_shift_operators(self):
+        A = [1, 2, 3, 4, 5]
+        B = [1, 2, 3, 4, 5]
+        self.assertEqual(A <<self.dot>> B, self.dot_product(A,B))
+
+    def test_cached_partials_keep_type_of_left_argument(self):
+        pair = make_infix(lambda x, y: (x, y))
+        self.assertTrue(type((1 |pair| 2)[0]) is int)
+        self.assertTrue(type((True |pair| 2)[0]) is bool)
+        self.assertTrue(type((1L |pair| 2)[0]) is long)
+        self.assertEqual(1 |pair| 3, (1, 3))
+        self.assertTrue(type((-0.0 |pair| 0)[0]) is float)
+        self.assertEqual(str(-0.0 |pair| 0), '(-0.0, 0)')
+        self.assertEqual(str(0.0 |pair| 0), '(0.0, 0)')
+
+    def test_slots(self):
+        self.assertRaises(AttributeError, setattr, self.dot, 'x', 1)
+        self.assertRaises(AttributeError, setattr, [1] |self.dot, 'x', 1)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_left_argument(self):
+        A = numpy.array([1, 2, 3])
+        self.assertEqual(A |self.dot| A, 14)
+
+
+class Tests_deferred(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        def dot_product(x, y):
+            self.calls.append('dot')
+            return sum(itertools.starmap(mul, itertools.izip(x, y)))
+        self.dot_product = dot_product
+        self.dot = make_infix(dot_product, deferred=True)
+
+        def cross_product(x,y):
+            self.calls.append('cross')
+            return list(itertools.starmap(mul, itertools.izip(x, y)))
+        self.cross_product = cross_product
+        self.cross = make_infix(cross_product, deferred=True, elementwise=mul)
+        self.plus = make_infix(lambda x, y: map(add, x, y), deferred=True, elementwise=add)
+
+    def test_tripple_is_fused(self):
+        A = [1, 2, 3, 4, 5]
+        B = [1, 2, 3, 4, 5]
+        C = [7, 8, 9, 10, 11]
+        expression = A |self.cross| B |self.cross| C
+        self.assertTrue(isinstance(expression, Expression))
+        self.assertEqual(expression.evaluate(), self.cross_product(self.cross_product(A,B),C))
+        self.assertEqual(self.calls, ['cross', 'cross']) # only the eager ones
 
+    def test_common_subexpressions_are_evaluated_once(self):
+        A = [1, 2, 3]
+        B = [4, 5, 6]
+        times = make_infix(mul, deferred=True)
+        expression = (A |self.dot| B) |times| (A |self.dot| B)
+        self.assertEqual(evaluate(expression), 32 * 32)
+        self.assertEqual(self.calls, ['dot'])
 
+    def test_mixed_expression(self):
+        A = [1, 2, 3]
+        B = [4, 5, 6]
+        expression = ((A |self.cross| B) |self.plus| A) |self.dot| B
+        self.assertEqual(evaluate(expression), sum((a * b + a) * b for a, b in zip(A, B)))
+        self.assertEqual(self.calls, ['dot'])
 
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_expression(self):
+        A = numpy.array([1, 2, 3])
+        B = numpy.array([4, 5, 6])
+        multiply = make_infix(numpy.multiply, deferred=True, elementwise=numpy.multiply)
+        plus = make_infix(numpy.add, deferred=True, elementwise=numpy.add)
+        result = evaluate(A |multiply| B |plus| A)
+        self.assertTrue(isinstance(result, numpy.ndarray))
+        self.assertEqual(list(result), [5, 12, 21])
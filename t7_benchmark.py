@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Benchmark of parallel SCC search from t7_scc against sequential Kosaraju's algorithm.
+
+The graph is random and sparse: nodes are split into clusters connected by cycles inside
+(so that there are non-trivial components) plus random edges between them.
+
+Usage:
+    python t7_benchmark.py --nodes 6 --degree 1.2 --workers 1 2 4 8
+
+Number of nodes is given as a power of ten, number of edges as average out-degree.
+"""
+from __future__ import division
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import unittest
+
+import t7_scc
+
+
+def random_graph(nodes, edges, cluster_size=100, seed=0):
+    """
+    List of edges of a random graph with given number of nodes and (approximately) edges.
+    Random edges go from lower numbers to higher ones, otherwise the graph collapses into one giant component.
+    """
+    generator = random.Random(seed)
+    result = [(a, a + 1 if (a + 1) % cluster_size and a + 1 < nodes else a - a % cluster_size)
+        for a in xrange(nodes)]
+    for _ in xrange(edges - nodes):
+        result.append(tuple(sorted((generator.randrange(nodes), generator.randrange(nodes)))))
+    return result
+
+
+def _run_with_deep_recursion(f, *args):
+    """
+    Run f in a thread with large stack, since Kosaraju's algorithm in t7_scc is recursive.
+    """
+    result = []
+    threading.stack_size(512 * 1024 * 1024)
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(10**7)
+    try:
+        thread = threading.Thread(target=lambda: result.append(f(*args)))
+        thread.start()
+        thread.join()
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+        threading.stack_size(0)
+    return result[0]
+
+
+def _canonical(groups):
+    return sorted(map(sorted, groups))
+
+
+def run(nodes, edges, workers=(1, 2, 4), threshold=t7_scc.DEFAULT_THRESHOLD):
+    """
+    Measure sequential and parallel SCC search on a random graph.
+    Return dict ready to be dumped to JSON.
+    """
+    graph = random_graph(nodes, edges)
+
+    started = time.time()
+    groups = _run_with_deep_recursion(t7_scc.get_leaders_from_edges, graph)
+    sequential = time.time() - started
+    expected = _canonical(groups)
+
+    report = {'nodes': nodes, 'edges': len(graph), 'components': len(expected), 'sequential_seconds': sequential,
+        'consistent': True, 'parallel': []}
+    for number in workers:
+        started = time.time()
+        groups = t7_scc.get_leaders_from_edges_in_parallel(graph, workers=number, threshold=threshold)
+        elapsed = time.time() - started
+        consistent = _canonical(groups) == expected
+        report['consistent'] = report['consistent'] and consistent
+        report['parallel'].append({'workers': number, 'seconds': elapsed,
+            'speedup': sequential / elapsed if elapsed else None, 'consistent': consistent})
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark parallel SCC search from t7_scc.')
+    parser.add_argument('--nodes', type=int, default=5, metavar='K', help='number of nodes is 10**K')
+    parser.add_argument('--degree', type=float, default=1.2, help='average out-degree of a node')
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4], help='numbers of processes to try')
+    parser.add_argument('--threshold', type=int, default=t7_scc.DEFAULT_THRESHOLD,
+        help='size of subproblems solved sequentially')
+    arguments = parser.parse_args(argv)
+
+    report = run(10**arguments.nodes, int(10**arguments.nodes * arguments.degree), arguments.workers, arguments.threshold)
+    json.dump(report, sys.stdout, indent=2)
+    return 0 if report['consistent'] else 1
+
+
+class Tests(unittest.TestCase):
+    def test_run(self):
+        report = run(1000, 3000, workers=[1, 2], threshold=50)
+        self.assertTrue(report['consistent'])
+        self.assertEqual([result['workers'] for result in report['parallel']], [1, 2])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
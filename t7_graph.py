@@ -1,15 +1,110 @@
 #!/usr/bin/env python
 from __future__ import division
 import inspect
-from itertools import izip, chain, imap, takewhile, count, islice
+import json
+from itertools import izip, chain, takewhile, count, islice
 from collections import namedtuple, defaultdict
 from copy import deepcopy, copy
+import heapq
+import Queue
+import sys
+import threading
+import time
 import unittest
-import t7_scc
 
 
 _Node = namedtuple('node', ['function', 'depends_on'])
 
+# How a function node is executed, see Graph.add_function
+_Policy = namedtuple('policy', ['timeout', 'retries', 'backoff', 'node_class'])
+
+
+class NodeTimeout(ValueError):
+    """
+    Raised when a function node hasn't finished within its timeout.
+    Being a ValueError, it makes the node fall back on its default value.
+    """
+
+
+class BulkheadFull(ValueError):
+    """
+    Raised when a function node couldn't start because its class has reached its concurrency limit.
+    Being a ValueError, it makes the node fall back on its default value.
+    """
+
+
+class _Bulkhead(object):
+    """
+    Semaphore which can be waited on with timeout.
+    """
+
+    def __init__(self, limit):
+        self._available = limit
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        with self._condition:
+            deadline = None if timeout is None else time.time() + timeout
+            while not self._available:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._available -= 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._available += 1
+            self._condition.notify()
+
+
+def _call_once(function, kwargs, timeout, bulkhead):
+    started = time.time()
+    if bulkhead is not None and not bulkhead.acquire(timeout):
+        raise BulkheadFull("No free slot to call '{name}'".format(name=function.__name__))
+    if timeout is None:
+        try:
+            return function(**kwargs)
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+
+    outcome = []
+    def call():
+        try:
+            outcome.append((True, function(**kwargs)))
+        except:
+            outcome.append((False, sys.exc_info()))
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+    # The thread can't be killed, so on timeout it is left to finish in background holding its slot in bulkhead
+    thread = threading.Thread(target=call, name='graph-node-' + function.__name__)
+    thread.daemon = True
+    thread.start()
+    thread.join(max(0, timeout - (time.time() - started)))
+    if not outcome:
+        raise NodeTimeout("'{name}' hasn't finished in {timeout} seconds".format(name=function.__name__,
+            timeout=timeout))
+    succeeded, result = outcome[0]
+    if succeeded:
+        return result
+    raise result[0], result[1], result[2]
+
+
+def _call_with_policy(function, kwargs, policy, bulkhead):
+    """
+    Call function retrying on any exception with exponential backoff.
+    """
+    for attempt in count():
+        try:
+            return _call_once(function, kwargs, policy.timeout, bulkhead)
+        except Exception:
+            if attempt >= policy.retries:
+                raise
+            time.sleep(policy.backoff * 2**attempt)
+
 def _split_list(alist, *indices):
     """
     Split alist at positions specified by indices and return iterator over resulting lists.
@@ -33,6 +128,15 @@ class Graph(object):
         self._dependencies = {}
         self._defaults = {}
 
+        # Topological order of all the names (functions and parameters) maintained incrementally
+        # by Pearce-Kelly algorithm: a name always goes after all the names it depends on.
+        self._order = {} # name -> position
+        self._next_position = 0
+        self._dependents = defaultdict(set) # name -> names of functions depending on it
+
+        self._policies = {} # function name -> _Policy
+        self._concurrency_limits = {} # node class -> maximal number of simultaneously running functions
+
         self._debug_print(1, 'New graph object has been initialized.')
 
 
@@ -42,7 +146,7 @@ class Graph(object):
             print(message)
 
 
-    def add_function(self, f):
+    def add_function(self, f=None, timeout=None, retries=0, backoff=0.0, node_class=None):
         """
         Add function to current graph object.
 
@@ -73,7 +177,23 @@ class Graph(object):
         of the dependency graph, in which case it will be tried to calculate based on its dependencies
         and if failed, then the default value will be taken)
 
+        Execution of the function may be controlled by options:
+
+        @graph_object.add_function(timeout=0.5, retries=2, backoff=0.1, node_class='db')
+        def rows(query):
+            return fetch(query)
+
+        timeout: seconds to wait for the result (run in a separate thread),
+            after which the value is regarded as failed to calculate, so the default value is taken if there is one
+        retries: number of extra attempts if the function raises or times out
+        backoff: delay before the first retry in seconds, doubled for every next one
+        node_class: name of the class of functions sharing the limit set by set_concurrency_limit;
+            when the limit is reached, the function waits for a free slot (no longer than timeout)
         """
+        if f is None:
+            return lambda f: self.add_function(f, timeout, retries, backoff, node_class)
+        if retries < 0:
+            raise(ValueError("Number of retries must be non-negative. You gave '{retries}'".format(retries=retries)))
 
         arguments = inspect.getargspec(f).args
         default_values = inspect.getargspec(f).defaults
@@ -98,8 +218,11 @@ class Graph(object):
             if name in self._defaults:
                 raise(ValueError("The default value for '{name}' has already been specified".format(name = name)))
 
+        self._add_to_topological_order(fname, set(arguments))
         self._dependencies[fname] = _Node(function = f, depends_on = set(arguments))
         self._defaults.update(defaults_dict)
+        if (timeout, retries, node_class) != (None, 0, None):
+            self._policies[fname] = _Policy(timeout, retries, backoff, node_class)
 
         self._debug_print(2, "Updating done.")
         self._debug_print(2, "Dependencies are now {dependencies}", dependencies = self._dependencies)
@@ -108,57 +231,257 @@ class Graph(object):
         return f
 
 
+    def _add_name(self, name):
+        if name not in self._order:
+            self._order[name] = self._next_position
+            self._next_position += 1
+            return True
+        return False
+
+
+    def _add_to_topological_order(self, fname, depends_on):
+        """
+        Add edges from names in depends_on to fname keeping the topological order.
+        Raise ValueError (leaving the graph intact) if an edge would make a cycle.
+        """
+        added_names = [name for name in chain([fname], depends_on) if self._add_name(name)]
+        added_edges = []
+        try:
+            for name in depends_on:
+                self._add_edge(name, fname)
+                added_edges.append(name)
+        except ValueError:
+            for name in added_edges:
+                self._dependents[name].discard(fname)
+            for name in added_names:
+                del self._order[name]
+            raise
+
+
+    def _add_edge(self, before, after):
+        """
+        Pearce-Kelly: only the names with positions between the positions of after and before
+        (the affected region) are visited and reordered.
+        """
+        order = self._order
+        if before == after:
+            raise(ValueError("You have cyclic dependencies between functions:\n{name} <-> {name}".format(name=after)))
+        lower, upper = order[after], order[before]
+        if upper < lower: # the order is already right
+            self._dependents[before].add(after)
+            return
+
+        # names reachable from after within the affected region; reaching before means a cycle
+        forward, parents, stack = set([after]), {}, [after]
+        while stack:
+            name = stack.pop()
+            for dependent in self._dependents[name]:
+                if dependent == before:
+                    path = [name]
+                    while path[-1] != after:
+                        path.append(parents[path[-1]])
+                    cycle = [before] + list(reversed(path))
+                    raise(ValueError("You have cyclic dependencies between functions:\n" + ' <-> '.join(cycle)))
+                if dependent not in forward and order[dependent] < upper:
+                    forward.add(dependent)
+                    parents[dependent] = name
+                    stack.append(dependent)
+
+        # names before reaches backwards within the affected region
+        backward, stack = set([before]), [before]
+        while stack:
+            name = stack.pop()
+            node = self._dependencies.get(name)
+            for dependency in (() if node is None else node.depends_on):
+                if dependency not in backward and order[dependency] > lower:
+                    backward.add(dependency)
+                    stack.append(dependency)
+
+        self._debug_print(3, "Reordering {backward} before {forward}", backward=backward, forward=forward)
+        names = sorted(backward, key=order.get) + sorted(forward, key=order.get)
+        positions = sorted(order[name] for name in names)
+        for name, position in izip(names, positions):
+            order[name] = position
+        self._dependents[before].add(after)
+
+
+    def set_concurrency_limit(self, node_class, limit):
+        """
+        Allow no more than limit functions of node_class to run simultaneously in each compiled graph
+        (shared by all its calculations).
+        """
+        if limit < 1:
+            raise(ValueError("Concurrency limit must be positive. You gave '{limit}'".format(limit=limit)))
+        self._concurrency_limits[node_class] = limit
+
+
     def compile(self):
         """
         Get a compiled object of a graph which can be later used to make calculations.
+        Cycles are rejected by add_function, so compilation only takes the maintained topological order.
         """
         self._debug_print(1, "### Staring compilation. ###")
         if not self._dependencies:
             raise(ValueError("There are no dependencies to be compiled. Add them by 'add_function' method."))
+        order = sorted(self._order, key=self._order.get)
+        return _CompiledGraph(copy(self._dependencies), copy(self._defaults), order, self._verbose_level,
+            copy(self._policies), self._concurrency_limits)
+
+
+class _Failed(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'FAILED'
+
+    def __reduce__(self):
+        return 'FAILED'
+
+FAILED = _Failed() # marks values failed to calculate in compact results
+
+
+class _CompactResult(tuple):
+    """
+    Base class of compact results: values of all the functions in a tuple indexed by node id
+    (FAILED for the values failed to calculate).
+    Subclasses with a property per function are generated by _make_result_type for each compiled graph.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, item):
+        if isinstance(item, basestring):
+            try:
+                item = self._ids[item]
+            except KeyError:
+                raise KeyError("No name '{}'".format(item))
+            value = tuple.__getitem__(self, item)
+            if value is FAILED:
+                raise ValueError("No value for '{name}'".format(name=self._names[item]))
+            return value
+        return tuple.__getitem__(self, item)
+
+    def failed(self):
+        """
+        Names of the functions failed to calculate.
+        """
+        return [name for name, value in izip(self._names, self) if value is FAILED]
+
+    def to_dict(self):
+        """
+        Dict of successfully calculated values.
+        """
+        return dict((name, value) for name, value in izip(self._names, self) if value is not FAILED)
 
-        # Search for cycles
-        sccs = t7_scc.get_leaders_from_edges((name, dependent) for (name, value) in self._dependencies.iteritems()
-            for dependent in value.depends_on)
-        self._debug_print(3, "Strongly connected components found: {scc}", scc=sccs)
-        if any(imap(lambda x: len(x) > 1, sccs)):
-            message = ["You have cyclic dependencies between functions:"]
-            for scc in sccs:
-                if len(scc) > 1:
-                    message.append(' <-> '.join(scc))
-            raise(ValueError('\n'.join(message)))
-        self._debug_print(2, "No cyclic dependencies found.")
-        return _CompiledGraph(copy(self._dependencies), copy(self._defaults), self._verbose_level)
+    def to_namedtuple(self):
+        """
+        Namedtuple of all the values (FAILED for the values failed to calculate).
+        """
+        return self._namedtuple._make(self)
+
+    def __repr__(self):
+        return '{cls}({values})'.format(cls=type(self).__name__,
+            values=', '.join('{}={!r}'.format(name, value) for name, value in izip(self._names, self)))
+
+
+def _make_result_type(names):
+    """
+    Generate subclass of _CompactResult for functions names, id of a function being its position in names.
+    Raise ValueError if a name clashes with an attribute of _CompactResult (including those of tuple),
+    since such a function couldn't be accessed as attribute.
+    """
+    clashing = [name for name in names if hasattr(_CompactResult, name)]
+    if clashing:
+        raise ValueError("Names of functions {names} clash with attributes of compact result".format(
+            names=', '.join(repr(name) for name in clashing)))
+
+    def make_property(i, name):
+        def get(self):
+            value = tuple.__getitem__(self, i)
+            if value is FAILED:
+                raise ValueError("No value for '{name}'".format(name=name))
+            return value
+        return property(get)
+
+    namespace = {
+        '__slots__': (),
+        '_names': tuple(names),
+        '_ids': dict((name, i) for i, name in enumerate(names)),
+        '_namedtuple': namedtuple('Result', names, rename=True),
+    }
+    namespace.update((name, make_property(i, name)) for i, name in enumerate(names))
+    return type('CompactResult', (_CompactResult,), namespace)
+
+
+def _check_workers(workers):
+    if workers < 1:
+        raise ValueError("Number of workers must be positive. You gave '{workers}'".format(workers=workers))
+
+
+class _Flight(object):
+    """
+    Calculation in progress whose result is awaited by the coalesced callers.
+    """
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+    def get(self):
+        self.finished.wait()
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
 
 
 class _CompiledGraph(object):
-    def __init__(self, dependencies, defaults, verbose_level = 0):
+    def __init__(self, dependencies, defaults, order, verbose_level = 0, policies = None, concurrency_limits = None):
+        """
+        order: all the names (functions and parameters) in topological order
+        policies: {function name: _Policy}
+        concurrency_limits: {node class: limit}
+        """
         self._dependencies = dependencies
         self._defaults = defaults
         self._verbose_level = verbose_level
-        self._topologically_sorted = self._sort_topologically()
-
-    def _sort_topologically(self):
+        self._policies = {} if policies is None else policies
+        self._bulkheads = dict((node_class, _Bulkhead(limit))
+            for node_class, limit in (concurrency_limits or {}).iteritems())
+        self._flights = {} # (name, fingerprint of parameters) -> _Flight
+        self._flights_lock = threading.Lock()
+        self._coalescing_stats = dict.fromkeys(['calls', 'calculations', 'coalesced', 'not_hashable'], 0)
+        self._topologically_sorted = self._sort_topologically(order)
+        self._functions = [name for level in islice(self._topologically_sorted, 1, None)
+            for name in sorted(level)] # in topological order, position of a function is its node id
+        self._result_type = None # generated on the first use by _get_result_type
+        self._dependents = dict((name, []) for name in self._functions) # function -> functions depending on it
+        for name in self._functions:
+            for dependency in self._dependencies[name].depends_on:
+                if dependency in self._dependents:
+                    self._dependents[dependency].append(name)
+        self._timings = {} # function -> (number of recorded calls, total seconds)
+        self._fallbacks = defaultdict(int) # function -> number of times it fell back on its default value
+        self._last_run = [] # (function, worker, start, end) of the last calculate_in_parallel, seconds from its start
+        self._timings_lock = threading.Lock()
+
+    def _sort_topologically(self, order):
+        """
+        Split names into levels in one pass over topological order:
+        parameters are on level 0, a function is on the level next to the highest of its dependencies.
+        """
         self._debug_print(1, "### Topological sorting ###")
 
         levels_by_name = {}
         names_by_level = defaultdict(set)
 
-        def walk_depth_first(name):
-            self._debug_print(3, "Searching depth for '{name}'", name=name)
-            if name in levels_by_name:
-                self._debug_print(3, "'{name}' seems to be in cache and is equal to {value}", name=name, value=levels_by_name[name])
-                return levels_by_name[name]
+        for name in order:
             node = self._dependencies.get(name, None)
             depends_on = None if node is None else node.depends_on
             self._debug_print(3, "'{name}' depends on {depends_on}", name=name, depends_on=depends_on)
-            level = 0 if depends_on is None else (1 + max(walk_depth_first(lname) for lname in depends_on))
+            level = 0 if depends_on is None else (1 + max(levels_by_name[lname] for lname in depends_on))
             self._debug_print(3, "'{name}' level is {level}", name=name, level=level)
             levels_by_name[name] = level
             names_by_level[level].add(name)
-            return level
-
-        for name in self._dependencies:
-            walk_depth_first(name)
 
         return list(takewhile(lambda x: x is not None, (names_by_level.get(i, None) for i in count())))
 
@@ -201,13 +524,384 @@ class _CompiledGraph(object):
         To get the value of the needed function, use
         - access by index result['name']
         - attribute access result.name
+
+        Concurrent calls (from different threads) with equal parameters are coalesced (see calculate_value)
+        and share the same result.
         """
         self._debug_print(1, "### Get calculated result ###")
+        return self._coalesce(None, kwargs, lambda: self._calculate_eagerly(kwargs))
+
+
+    def _calculate_eagerly(self, kwargs):
         result = self.lazily_calculate(**kwargs)
         result.calculate_all()
+        result.calculate_all_possible() # values failed to calculate still raise ValueError when accessed
         return result
 
 
+    def calculate_compact(self, **kwargs):
+        """
+        Calculate all the values which could be calculated and return them as a compact result:
+        a tuple with values of the functions (in order of node_ids) and properties to access them by name.
+        It has no per-object dict, so it's cheap to keep many of them in memory.
+        """
+        return self.lazily_calculate(**kwargs).to_compact()
+
+
+    def node_ids(self):
+        """
+        Get dict {function name: its position in compact results}.
+        """
+        return dict((name, i) for i, name in enumerate(self._functions))
+
+
+    def _get_result_type(self):
+        if self._result_type is None:
+            self._result_type = _make_result_type(self._functions)
+        return self._result_type
+
+
+    def record_timing(self, name, seconds):
+        """
+        Add a measured duration of function name to the learned cost model.
+        """
+        with self._timings_lock:
+            calls, total = self._timings.get(name, (0, 0.0))
+            self._timings[name] = (calls + 1, total + seconds)
+
+
+    def record_fallback(self, name):
+        """
+        Count that function name fell back on its default value.
+        """
+        with self._timings_lock:
+            self._fallbacks[name] += 1
+
+
+    def timings(self):
+        """
+        Get dict {function name: mean recorded duration in seconds}.
+        """
+        with self._timings_lock:
+            return dict((name, total / calls) for name, (calls, total) in self._timings.iteritems())
+
+
+    def estimate_costs(self, costs=None):
+        """
+        Get dict {function name: estimated cost in seconds}.
+        Costs given by user take precedence over the recorded timings;
+        functions with neither are estimated by the mean of the known costs (or 1 if nothing is known).
+        """
+        estimates = self.timings()
+        estimates.update(costs or {})
+        fallback = sum(estimates.itervalues()) / len(estimates) if estimates else 1.0
+        return dict((name, estimates.get(name, fallback)) for name in self._functions)
+
+
+    def _upward_ranks(self, costs):
+        """
+        Length of the most expensive path from each function to the end of the graph, including the function itself.
+        """
+        ranks = {}
+        for name in reversed(self._functions):
+            ranks[name] = costs[name] + max(chain([0], (ranks[dependent] for dependent in self._dependents[name])))
+        return ranks
+
+
+    def critical_path(self, costs=None):
+        """
+        Get list of functions on the most expensive path through the graph.
+        """
+        ranks = self._upward_ranks(self.estimate_costs(costs))
+        sources = [name for name in self._functions if not any(dependency in ranks
+            for dependency in self._dependencies[name].depends_on)]
+        path = [max(sources, key=ranks.get)] if sources else []
+        while path and self._dependents[path[-1]]:
+            path.append(max(self._dependents[path[-1]], key=ranks.get))
+        return path
+
+
+    def _number_of_dependencies(self):
+        return dict((name, sum(1 for dependency in self._dependencies[name].depends_on if dependency in self._dependents))
+            for name in self._functions)
+
+
+    def predict_makespan(self, workers, costs=None):
+        """
+        Predict the time of calculation of all the functions by workers threads with list scheduling
+        which starts ready functions in order of their critical path length (as calculate_in_parallel does).
+        """
+        schedule = self._simulate_schedule(workers, self.estimate_costs(costs))
+        return max(chain([0.0], (end for _, _, _, end in schedule)))
+
+
+    def _simulate_schedule(self, workers, costs):
+        """
+        Get list of (function, worker, start, end) of list scheduling with estimated costs.
+        """
+        _check_workers(workers)
+        ranks = self._upward_ranks(costs)
+        waiting_for = self._number_of_dependencies()
+        ready = [(-ranks[name], name) for name, number in waiting_for.iteritems() if not number]
+        heapq.heapify(ready)
+        running, free_workers, schedule, now = [], range(workers - 1, -1, -1), [], 0.0
+        while ready or running:
+            while ready and free_workers:
+                _, name = heapq.heappop(ready)
+                worker = free_workers.pop()
+                schedule.append((name, worker, now, now + costs[name]))
+                heapq.heappush(running, (now + costs[name], name, worker))
+            now, name, worker = heapq.heappop(running)
+            free_workers.append(worker)
+            for dependent in self._dependents[name]:
+                waiting_for[dependent] -= 1
+                if not waiting_for[dependent]:
+                    heapq.heappush(ready, (-ranks[dependent], dependent))
+        return schedule
+
+
+    def calculate_in_parallel(self, workers, parameters=None, costs=None):
+        """
+        Calculate all the possible values by workers threads basing on parameters dict
+        (passed as a dict, so that the names of parameters don't clash with the options).
+        Ready functions are started in order of the length of the most expensive path from them to the end
+        of the graph (HEFT-style list scheduling), so long chains are not delayed by cheap functions.
+        Costs are taken from costs dict, from timings recorded by previous calculations or estimated
+        (see estimate_costs). Durations of the successfully calculated functions are recorded to refine the costs
+        (failed calls and calls falling back on default values are not representative).
+
+        Return the lazy result (as lazily_calculate does, with all the possible values calculated)
+        and dict with predicted and actual makespan in seconds, number of workers and the critical path.
+        """
+        self._debug_print(1, "### Calculating in parallel ###")
+        _check_workers(workers)
+        costs = self.estimate_costs(costs)
+        ranks = self._upward_ranks(costs)
+        predicted = self.predict_makespan(workers, costs)
+        evaluator = self.lazily_calculate(**(parameters or {}))
+        for name in self._topologically_sorted[0]:
+            try:
+                evaluator._calculate_value(name)
+            except ValueError:
+                pass # the functions depending on it will fall back on defaults or fail
+
+        tasks, finished, run = Queue.PriorityQueue(), Queue.Queue(), []
+        def work(worker):
+            while True:
+                _, name = tasks.get()
+                if name is None:
+                    return
+                node_started = time.time()
+                try:
+                    evaluator._calculate_value(name)
+                    outcome = None
+                except ValueError:
+                    outcome = None
+                except:
+                    outcome = sys.exc_info()
+                node_finished = time.time()
+                if name in evaluator._cache and name not in evaluator._fell_back:
+                    self.record_timing(name, node_finished - node_started)
+                run.append((name, worker, node_started - started, node_finished - started))
+                finished.put((name, outcome))
+
+        # all the initially ready functions are queued before workers start, so they are taken in order of rank
+        waiting_for = self._number_of_dependencies()
+        for name, number in waiting_for.iteritems():
+            if not number:
+                tasks.put((-ranks[name], name))
+        started = time.time()
+        threads = [threading.Thread(target=work, args=(i,), name='graph-worker-{}'.format(i)) for i in xrange(workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for _ in self._functions:
+                name, outcome = finished.get()
+                if outcome is not None:
+                    raise outcome[0], outcome[1], outcome[2]
+                for dependent in self._dependents[name]:
+                    waiting_for[dependent] -= 1
+                    if not waiting_for[dependent]:
+                        tasks.put((-ranks[dependent], dependent))
+            actual = time.time() - started
+        finally:
+            for _ in threads:
+                tasks.put((float('inf'), None))
+        with self._timings_lock:
+            self._last_run = sorted(run, key=lambda span: span[2])
+        return evaluator, {'workers': workers, 'predicted_makespan': predicted, 'actual_makespan': actual,
+            'critical_path': self.critical_path(costs)}
+
+
+    def plan(self, costs=None):
+        """
+        Get dict describing how the graph is calculated:
+        levels: lists of names by level (level 0 are parameters)
+        nodes: {name: dict with level, fan_in, fan_out, whether it has default value,
+            estimated cost, recorded mean duration and number of fallbacks on default} for each function
+        critical_path and its estimated cost
+        parallelism: estimated parallelism of each level of functions (total cost / maximal cost)
+        fallbacks: {function: number of times it fell back on its default value}
+        """
+        costs = self.estimate_costs(costs)
+        timings = self.timings()
+        with self._timings_lock:
+            fallbacks = dict(self._fallbacks)
+        levels = [sorted(level) for level in self._topologically_sorted]
+        nodes = {}
+        for level_number, level in enumerate(levels):
+            for name in level:
+                if name not in self._dependents:
+                    continue
+                nodes[name] = {
+                    'level': level_number,
+                    'fan_in': len(self._dependencies[name].depends_on),
+                    'fan_out': len(self._dependents[name]),
+                    'has_default': name in self._defaults,
+                    'cost': costs[name],
+                    'recorded_seconds': timings.get(name),
+                    'fallbacks': fallbacks.get(name, 0),
+                }
+        critical_path = self.critical_path(costs)
+        return {
+            'levels': levels,
+            'nodes': nodes,
+            'critical_path': critical_path,
+            'critical_path_cost': sum(costs[name] for name in critical_path),
+            'parallelism': [sum(costs[name] for name in level) / max(costs[name] for name in level)
+                if max(costs[name] for name in level) else len(level) for level in levels[1:]],
+            'fallbacks': fallbacks,
+        }
+
+
+    def explain(self, costs=None):
+        """
+        Get human readable description of the plan (see plan).
+        """
+        plan = self.plan(costs)
+        lines = ['Parameters: {}'.format(', '.join(plan['levels'][0]) if plan['levels'] else '')]
+        for level_number, (level, parallelism) in enumerate(izip(plan['levels'][1:], plan['parallelism']), 1):
+            lines.append('Level {level} (estimated parallelism {parallelism:.2f}):'.format(level=level_number,
+                parallelism=parallelism))
+            for name in level:
+                node = plan['nodes'][name]
+                recorded = node['recorded_seconds']
+                lines.append('  {name}: fan-in {fan_in}, fan-out {fan_out}, cost {cost:.6f}s, recorded {recorded}'
+                    '{default}{fallbacks}'.format(name=name, fan_in=node['fan_in'], fan_out=node['fan_out'],
+                    cost=node['cost'], recorded='-' if recorded is None else '{:.6f}s'.format(recorded),
+                    default=', has default' if node['has_default'] else '',
+                    fallbacks=', fell back {} times'.format(node['fallbacks']) if node['fallbacks'] else ''))
+        lines.append('Critical path ({cost:.6f}s): {path}'.format(cost=plan['critical_path_cost'],
+            path=' -> '.join(plan['critical_path'])))
+        return '\n'.join(lines)
+
+
+    def to_dot(self, costs=None):
+        """
+        Get the graph in Graphviz DOT format: parameters are ellipses, functions are boxes labeled with
+        their estimated costs, the critical path is bold, names having default values are dashed.
+        """
+        costs = self.estimate_costs(costs)
+        critical_path = self.critical_path(costs)
+        critical_edges = set(izip(critical_path, critical_path[1:]))
+        lines = ['digraph compiled {', '  rankdir=LR;']
+        for name in sorted(self._topologically_sorted[0]) if self._topologically_sorted else []:
+            lines.append('  "{name}" [shape=ellipse{style}];'.format(name=name,
+                style=', style=dashed' if name in self._defaults else ''))
+        for name in self._functions:
+            lines.append('  "{name}" [shape=box, label="{name}\\n{cost:.6f}s"{style}];'.format(name=name,
+                cost=costs[name], style=', style=dashed' if name in self._defaults else ''))
+        for name in self._functions:
+            for dependency in sorted(self._dependencies[name].depends_on):
+                lines.append('  "{dependency}" -> "{name}"{style};'.format(dependency=dependency, name=name,
+                    style=' [style=bold]' if (dependency, name) in critical_edges else ''))
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+    def to_chrome_trace(self, workers=1, costs=None):
+        """
+        Get JSON trace for Chrome about:tracing with the schedule predicted for workers threads
+        (process 'predicted') and the last calculate_in_parallel run (process 'actual'), if any.
+        """
+        with self._timings_lock:
+            last_run = list(self._last_run)
+        events = []
+        for pid, schedule in enumerate([self._simulate_schedule(workers, self.estimate_costs(costs)), last_run]):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': ['predicted', 'actual'][pid]}})
+            for name, worker, start, end in schedule:
+                events.append({'name': name, 'ph': 'X', 'pid': pid, 'tid': worker,
+                    'ts': start * 1e6, 'dur': (end - start) * 1e6})
+        return json.dumps({'traceEvents': events})
+
+
+    def calculate_value(self, *args, **kwargs):
+        """
+        calculate_value(name, **parameters)
+
+        Calculate the value of the function name basing on the parameters provided in the arguments.
+        (name is positional only, so that it doesn't clash with a parameter called 'name').
+
+        Concurrent calls (from different threads) for the same name with equal parameters are coalesced:
+        only the first one calculates the value and the rest wait for its result (or its exception).
+        Calls with unhashable parameters are calculated independently.
+        """
+        if len(args) != 1:
+            raise TypeError("calculate_value() takes exactly 1 positional argument ({} given)".format(len(args)))
+        name, = args
+        return self._coalesce(name, kwargs, lambda: self.lazily_calculate(**kwargs)[name])
+
+
+    def _coalesce(self, name, kwargs, calculate):
+        """
+        Call calculate unless a calculation with the same name and parameters is in flight,
+        otherwise wait for its result. name is None for calculation of all the functions.
+        """
+        try:
+            key = (name, frozenset(kwargs.iteritems()))
+            hash(key)
+        except TypeError:
+            key = None
+        with self._flights_lock:
+            self._coalescing_stats['calls'] += 1
+            if key is None:
+                self._coalescing_stats['not_hashable'] += 1
+                flight, leader = None, True
+            else:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                else:
+                    self._coalescing_stats['coalesced'] += 1
+            if leader:
+                self._coalescing_stats['calculations'] += 1
+
+        if not leader:
+            self._debug_print(2, "Waiting for calculation of '{name}' in progress", name=name)
+            return flight.get()
+        if flight is None:
+            return calculate()
+        try:
+            flight.result = calculate()
+        except:
+            flight.exc_info = sys.exc_info()
+        with self._flights_lock:
+            del self._flights[key]
+        flight.finished.set()
+        return flight.get()
+
+
+    def coalescing_stats(self):
+        """
+        Get dict with the numbers of calls of calculate and calculate_value, actual calculations,
+        calls which waited for a calculation of another call and calls with unhashable parameters.
+        """
+        with self._flights_lock:
+            return dict(self._coalescing_stats)
+
+
 class _Evaluator(object):
     def __init__(self, compiled_graph, **kwargs):
         """
@@ -219,9 +913,14 @@ class _Evaluator(object):
         self._defaults = compiled_graph._defaults
         self._verbose_level = compiled_graph._verbose_level
         self._topologically_sorted = compiled_graph._topologically_sorted
+        self._policies = compiled_graph._policies
+        self._get_result_type = compiled_graph._get_result_type
+        self._record_fallback = compiled_graph.record_fallback
+        self._bulkheads = compiled_graph._bulkheads
         self._all_names = set(name for level in self._topologically_sorted for name in level)
         self._cache = {}
         self._failed_to_calculate = set()
+        self._fell_back = set() # functions which fell back on default values
 
         self._debug_print(1, "### Creating evaluator ###")
 
@@ -244,7 +943,11 @@ class _Evaluator(object):
         kwargs = {}
         for dependant in self._dependencies[name].depends_on:
             kwargs[dependant] = self._calculate_value(dependant)
-        return self._dependencies[name].function(**kwargs)
+        policy = self._policies.get(name)
+        if policy is None:
+            return self._dependencies[name].function(**kwargs)
+        return _call_with_policy(self._dependencies[name].function, kwargs, policy,
+            self._bulkheads.get(policy.node_class))
 
     def _calculate_value(self, name):
         self._debug_print(2, "Calculating value for '{name}'", name=name)
@@ -271,6 +974,8 @@ class _Evaluator(object):
                 self._debug_print(3, "Somebody of '{name}' dependants threw ValueError", name=name)
                 if name in self._defaults: # fall back on default value
                     self._debug_print(3, "Taking default value of '{name}'", name=name)
+                    self._record_fallback(name)
+                    self._fell_back.add(name)
                     result = self._defaults[name]
                 else:
                     self._failed_to_calculate.add(name)
@@ -327,6 +1032,15 @@ class _Evaluator(object):
         return ((name, self[name]) for level in islice(self._topologically_sorted, 1, None) for name in level if name not in self._failed_to_calculate)
 
 
+    def to_compact(self):
+        """
+        Calculate all the possible values and pack them into compact result of the compiled graph.
+        """
+        self.calculate_all_possible()
+        result_type = self._get_result_type()
+        return result_type(self._cache.get(name, FAILED) for name in result_type._names)
+
+
 
 
 class Tests(unittest.TestCase):
@@ -378,7 +1092,7 @@ class Tests(unittest.TestCase):
         self.assertEqual(result_two, 81)
 
 
-    def test_compilation_produces_valueerror_on_cycles_in_dependencies(self):
+    def test_adding_function_produces_valueerror_on_cycles_in_dependencies(self):
         graph = Graph()
 
         @graph.add_function
@@ -393,11 +1107,56 @@ class Tests(unittest.TestCase):
         def c(b):
             return b*b
 
-        @graph.add_function
         def x(c):
             return c*c
 
-        self.assertRaises(ValueError, graph.compile)
+        self.assertRaises(ValueError, graph.add_function, x)
+        # the graph is left intact
+        self.assertEqual(graph.compile().calculate(x=2).c, 256)
+
+
+    def test_self_dependency_is_a_cycle(self):
+        graph = Graph()
+
+        def a(a):
+            return a
+
+        self.assertRaises(ValueError, graph.add_function, a)
+
+
+    def test_incremental_order_is_topological(self):
+        graph = Graph()
+
+        @graph.add_function
+        def d(c, y):
+            return c + y
+
+        @graph.add_function
+        def c(b):
+            return b
+
+        @graph.add_function
+        def b(a, x):
+            return a + x
+
+        @graph.add_function
+        def a(x):
+            return x
+
+        def e(d):
+            return d
+        graph.add_function(e)
+
+        self.assertEqual(graph.compile().sort_topologically(),
+            [set(['x', 'y']), set(['a']), set(['b']), set(['c']), set(['d']), set(['e'])])
+        for name, node in graph._dependencies.iteritems():
+            for dependency in node.depends_on:
+                self.assertTrue(graph._order[dependency] < graph._order[name])
+
+        def x(e):
+            return e
+        self.assertRaises(ValueError, graph.add_function, x)
+        self.assertEqual(graph.compile().calculate(x=1, y=10).e, 12)
 
 
     def test_topological_sort_has_all_arguments_on_level_zero(self):
@@ -546,6 +1305,301 @@ class Tests(unittest.TestCase):
         self.assertEquals(dict(result.iterate_over_successfully_calculated()), {'b': 6, 'd': 9})
 
 
+    def test_timed_out_function_falls_back_on_default(self):
+        graph = Graph()
+        release = threading.Event()
+
+        @graph.add_function(timeout=0.05)
+        def a(x):
+            release.wait()
+            return x
+
+        @graph.add_function
+        def b(a=-1):
+            return a*2
+
+        try:
+            result = graph.compile().lazily_calculate(x=3)
+            self.assertEqual((result.a, result.b), (-1, -2))
+        finally:
+            release.set()
+
+
+    def test_retries(self):
+        graph = Graph()
+        attempts = []
+
+        @graph.add_function(retries=2)
+        def a(x):
+            attempts.append(x)
+            if len(attempts) < 3:
+                raise RuntimeError("Try again")
+            return x
+
+        self.assertEqual(graph.compile().lazily_calculate(x=3).a, 3)
+        self.assertEqual(len(attempts), 3)
+        del attempts[:]
+
+        graph = Graph()
+        graph.add_function(retries=1)(a)
+        self.assertRaises(RuntimeError, graph.compile().lazily_calculate(x=3).__getitem__, 'a')
+        self.assertEqual(len(attempts), 2)
+
+
+    def test_identical_concurrent_calculations_are_coalesced(self):
+        graph = Graph()
+        release = threading.Event()
+        calls = []
+
+        @graph.add_function
+        def a(x):
+            calls.append(x)
+            release.wait()
+            return x * 2
+
+        compiled = graph.compile()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(compiled.calculate_value('a', x=1)))
+            for _ in xrange(5)]
+        for thread in threads:
+            thread.start()
+        while compiled.coalescing_stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((results, calls), ([2] * 5, [1]))
+        self.assertEqual(compiled.calculate_value('a', x=[2]), [2, 2]) # unhashable parameter
+        self.assertEqual(compiled.coalescing_stats(),
+            {'calls': 6, 'calculations': 2, 'coalesced': 4, 'not_hashable': 1})
+        self.assertRaises(ValueError, compiled.calculate_value, 'a')
+        self.assertRaises(TypeError, compiled.calculate_value, 'a', 'b')
+
+
+    def test_calculate_value_of_graph_with_parameter_called_name(self):
+        graph = Graph()
+
+        @graph.add_function
+        def greeting(name):
+            return 'Hello, ' + name
+
+        self.assertEqual(graph.compile().calculate_value('greeting', name='bob'), 'Hello, bob')
+
+
+    def test_compact_result(self):
+        graph = Graph()
+
+        @graph.add_function
+        def a(x):
+            return x*2
+
+        @graph.add_function
+        def b(a, y):
+            return a + y
+
+        @graph.add_function
+        def c(a):
+            return a + 1
+
+        compiled = graph.compile()
+        result = compiled.calculate_compact(x=1)
+        self.assertEqual(compiled.node_ids(), {'a': 0, 'b': 1, 'c': 2})
+        self.assertEqual(tuple(result), (2, FAILED, 3))
+        self.assertEqual((result.a, result['c']), (2, 3))
+        self.assertRaises(ValueError, getattr, result, 'b')
+        self.assertRaises(ValueError, result.__getitem__, 'b')
+        self.assertRaises(KeyError, result.__getitem__, 'x')
+        self.assertEqual(result.failed(), ['b'])
+        self.assertEqual(result.to_dict(), {'a': 2, 'c': 3})
+        self.assertEqual(result.to_namedtuple().b, FAILED)
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertEqual(compiled.calculate_compact(x=1, y=10).b, 12)
+
+
+    def test_compact_result_rejects_clashing_names(self):
+        graph = Graph()
+
+        @graph.add_function
+        def count(x):
+            return x + 1
+
+        compiled = graph.compile()
+        self.assertEqual(compiled.calculate(x=1).count, 2) # only compact results are affected
+        self.assertRaises(ValueError, compiled.calculate_compact, x=1)
+
+
+    def _graph_with_long_chain(self, calls):
+        graph = Graph()
+
+        @graph.add_function
+        def a(x):
+            calls.append('a')
+            return x + 1
+
+        @graph.add_function
+        def b(x):
+            calls.append('b')
+            return x * 2
+
+        @graph.add_function
+        def c(a):
+            calls.append('c')
+            return a * 10
+
+        @graph.add_function
+        def d(b, c):
+            calls.append('d')
+            return b + c
+
+        return graph.compile(), {'a': 1, 'b': 5, 'c': 1, 'd': 1}
+
+
+    def test_critical_path_and_predicted_makespan(self):
+        compiled, costs = self._graph_with_long_chain([])
+        self.assertEqual(compiled.critical_path(costs), ['b', 'd'])
+        self.assertEqual(compiled.predict_makespan(2, costs), 6)
+        self.assertEqual(compiled.predict_makespan(1, costs), 8)
+        self.assertEqual(compiled.estimate_costs({'b': 3}), {'a': 3, 'b': 3, 'c': 3, 'd': 3})
+        self.assertRaises(ValueError, compiled.predict_makespan, 0, costs)
+        self.assertRaises(ValueError, compiled.calculate_in_parallel, 0, {'x': 1})
+
+
+    def test_calculate_in_parallel(self):
+        calls = []
+        compiled, costs = self._graph_with_long_chain(calls)
+        result, report = compiled.calculate_in_parallel(1, {'x': 1}, costs)
+        self.assertEqual(calls, ['b', 'a', 'c', 'd']) # the start of the longest path goes first
+        self.assertEqual(result.d, 22)
+        self.assertEqual((report['workers'], report['predicted_makespan']), (1, 8))
+        self.assertEqual(sorted(compiled.timings()), ['a', 'b', 'c', 'd'])
+
+        result, report = compiled.calculate_in_parallel(3)
+        self.assertRaises(ValueError, getattr, result, 'd')
+        # failed calls are not recorded
+        self.assertEqual(sorted((name, calls) for name, (calls, _) in compiled._timings.iteritems()),
+            [('a', 1), ('b', 1), ('c', 1), ('d', 1)])
+
+
+    def test_calculate_in_parallel_with_parameters_named_as_options(self):
+        graph = Graph()
+
+        @graph.add_function
+        def total(workers, costs):
+            return workers + costs
+
+        @graph.add_function
+        def doubled(total=0):
+            return total * 2
+
+        compiled = graph.compile()
+        result, _ = compiled.calculate_in_parallel(2, {'workers': 1, 'costs': 2})
+        self.assertEqual(result.doubled, 6)
+        result, _ = compiled.calculate_in_parallel(2)
+        self.assertEqual(result.doubled, 0)
+        self.assertEqual(sorted(compiled.timings()), ['doubled', 'total']) # fallback of 'total' isn't recorded
+        self.assertEqual(compiled._timings['total'][0], 1)
+
+
+    def test_explain(self):
+        compiled, costs = self._graph_with_long_chain([])
+        plan = compiled.plan(costs)
+        self.assertEqual(plan['levels'], [['x'], ['a', 'b'], ['c'], ['d']])
+        self.assertEqual(plan['critical_path'], ['b', 'd'])
+        self.assertEqual(plan['parallelism'], [1.2, 1, 1])
+        self.assertEqual((plan['nodes']['d']['fan_in'], plan['nodes']['d']['fan_out']), (2, 0))
+        self.assertTrue('Critical path (6.000000s): b -> d' in compiled.explain(costs))
+
+        graph = Graph()
+
+        @graph.add_function
+        def a(x):
+            return x
+
+        @graph.add_function
+        def b(a=0):
+            return a
+
+        compiled = graph.compile()
+        compiled.lazily_calculate().b
+        self.assertEqual(compiled.plan()['fallbacks'], {'a': 1})
+        self.assertTrue('"x" -> "a";' in compiled.to_dot())
+
+
+    def test_chrome_trace(self):
+        compiled, costs = self._graph_with_long_chain([])
+        compiled.calculate_in_parallel(2, {'x': 1}, costs)
+        events = json.loads(compiled.to_chrome_trace(2, costs))['traceEvents']
+        spans = [(event['pid'], event['name']) for event in events if event['ph'] == 'X']
+        self.assertEqual(sorted(spans), sorted((pid, name) for pid in (0, 1) for name in 'abcd'))
+        predicted = dict((event['name'], (event['ts'], event['dur'])) for event in events
+            if event['ph'] == 'X' and event['pid'] == 0)
+        self.assertEqual(predicted['d'], (5e6, 1e6))
+
+
+    def test_identical_concurrent_full_calculations_are_coalesced(self):
+        graph = Graph()
+        release = threading.Event()
+        calls = []
+
+        @graph.add_function
+        def a(x):
+            calls.append('a')
+            release.wait()
+            return x * 2
+
+        @graph.add_function
+        def b(a):
+            calls.append('b')
+            return a + 1
+
+        compiled = graph.compile()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(compiled.calculate(x=1))) for _ in xrange(5)]
+        for thread in threads:
+            thread.start()
+        while compiled.coalescing_stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([result.b for result in results], [3] * 5)
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(compiled.calculate(x=2).b, 5) # nothing in flight, so calculated again
+
+
+    def test_concurrency_limit(self):
+        graph = Graph()
+        graph.set_concurrency_limit('slow', 1)
+        started, release = threading.Event(), threading.Event()
+
+        @graph.add_function(timeout=5, node_class='slow')
+        def a(x):
+            started.set()
+            release.wait()
+            return x
+
+        @graph.add_function(timeout=0.05, node_class='slow')
+        def b(y):
+            return y
+
+        @graph.add_function
+        def c(b=0):
+            return b
+
+        compiled = graph.compile()
+        thread = threading.Thread(target=lambda: compiled.lazily_calculate(x=1).a)
+        thread.start()
+        try:
+            started.wait()
+            self.assertEqual(compiled.lazily_calculate(y=2).c, 0) # 'b' has no free slot
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(compiled.lazily_calculate(y=2).c, 2)
+
+
 
 
 def example():
@@ -5,7 +5,11 @@ This module contains algorithm to find strongly connected components in the grap
 See Stanford algorithm class with Tim Roughgarden Part I.
 """
 
+from array import array
 from collections import defaultdict
+import multiprocessing
+import random
+import unittest
 
 file_name = 'scc_test2.txt'
 
@@ -71,6 +75,275 @@ def get_leaders_from_edges(edges):
     return leaders
 
 
+class Condensation(object):
+    """
+    Condensation DAG of a graph: each strongly connected component is contracted into a single node.
+
+    Components are numbered in topological order, so every edge of the DAG goes
+    from a lower number to a higher one.
+
+    components[i] - list of nodes of component i
+    sizes[i] - number of nodes in component i
+    successors[i] - tuple of components having an edge from component i
+    component_of[node] - number of the component the node belongs to
+
+    Reachability between components is answered in O(1) by bitsets precomputed
+    in one pass in reverse topological order (bit j of the bitset of i is set if j is reachable from i).
+    """
+
+    def __init__(self, groups, edges):
+        """
+        groups: lists of nodes of strongly connected components (as returned by get_leaders_from_edges)
+        edges: {node: list of nodes it has edges to}
+        """
+        group_of = {}
+        for i, group in enumerate(groups):
+            for node in group:
+                group_of[node] = i
+
+        group_successors = [set() for _ in groups]
+        in_degrees = [0] * len(groups)
+        for a, targets in edges.iteritems():
+            i = group_of[a]
+            for b in targets:
+                j = group_of[b]
+                if i != j and j not in group_successors[i]:
+                    group_successors[i].add(j)
+                    in_degrees[j] += 1
+
+        # Kahn's algorithm
+        order = [i for i, degree in enumerate(in_degrees) if degree == 0]
+        for i in order: # order grows while being iterated
+            for j in group_successors[i]:
+                in_degrees[j] -= 1
+                if not in_degrees[j]:
+                    order.append(j)
+        number_of = dict((group, number) for number, group in enumerate(order))
+
+        self.components = [list(groups[i]) for i in order]
+        self.sizes = [len(component) for component in self.components]
+        self.successors = [tuple(sorted(number_of[j] for j in group_successors[i])) for i in order]
+        self.component_of = dict((node, number_of[i]) for node, i in group_of.iteritems())
+
+        self._reachable = [0] * len(order)
+        for i in reversed(xrange(len(order))):
+            reachable = 1 << i
+            for j in self.successors[i]:
+                reachable |= self._reachable[j]
+            self._reachable[i] = reachable
+
+    def __len__(self):
+        return len(self.components)
+
+    def topological_order(self):
+        """
+        Components in topological order (sources first).
+        """
+        return list(self.components)
+
+    def component_reaches(self, i, j):
+        """
+        Check if component j is reachable from component i (each component is reachable from itself).
+        """
+        return bool(self._reachable[i] >> j & 1)
+
+    def reachable_components(self, i):
+        """
+        List of numbers of the components reachable from component i.
+        """
+        reachable = self._reachable[i]
+        return [j for j in xrange(i, len(self.components)) if reachable >> j & 1]
+
+    def reaches(self, a, b):
+        """
+        Check if node b is reachable from node a.
+        """
+        return self.component_reaches(self.component_of[a], self.component_of[b])
+
+
+def condensation(edges):
+    """
+    Get Condensation of the graph given by iterator over edges (pairs of nodes).
+    """
+    nodes, edges, edges_rev = _get_data_from_edges_iterator(edges)
+    leaders = _get_leaders(edges, edges_rev, nodes)
+    return Condensation(leaders, edges)
+
+
+# Parallel SCC search by forward-backward decomposition (Fleischer, Hendrickson, Pinar) with trimming.
+# The graph is kept in CSR arrays (offsets and targets) which worker processes inherit on fork,
+# so only lists of node numbers of subproblems travel between processes.
+
+DEFAULT_THRESHOLD = 10000 # subproblems not larger than this are solved by sequential Tarjan's algorithm
+
+_csr = None # (forward offsets, forward targets, backward offsets, backward targets)
+
+
+def _set_csr(*csr):
+    global _csr
+    _csr = csr if csr else None
+
+
+def _build_csr(edges_iterator):
+    """
+    Number nodes and build CSR arrays of the graph and of the reversed graph.
+    Return list of nodes by number and CSR arrays.
+    """
+    nodes, numbers, sources, targets = [], {}, array('l'), array('l')
+    for a, b in edges_iterator:
+        for node in (a, b):
+            if node not in numbers:
+                numbers[node] = len(nodes)
+                nodes.append(node)
+        sources.append(numbers[a])
+        targets.append(numbers[b])
+
+    def csr(sources, targets):
+        offsets = array('l', [0]) * (len(nodes) + 1)
+        for a in sources:
+            offsets[a + 1] += 1
+        for i in xrange(len(nodes)):
+            offsets[i + 1] += offsets[i]
+        position = array('l', offsets)
+        adjacent = array('l', [0]) * len(targets)
+        for a, b in zip(sources, targets):
+            adjacent[position[a]] = b
+            position[a] += 1
+        return offsets, adjacent
+
+    return nodes, csr(sources, targets) + csr(targets, sources)
+
+
+def _adjacent(offsets, targets, v, members):
+    return [w for w in targets[offsets[v]:offsets[v + 1]] if w in members]
+
+
+def _trim(members, sccs):
+    """
+    Repeatedly remove nodes having no incoming or no outgoing edges inside members,
+    each of them being a component by itself.
+    """
+    forward_offsets, forward_targets, backward_offsets, backward_targets = _csr
+    out_degrees = dict((v, len(_adjacent(forward_offsets, forward_targets, v, members))) for v in members)
+    in_degrees = dict((v, len(_adjacent(backward_offsets, backward_targets, v, members))) for v in members)
+    queue = [v for v in members if not out_degrees[v] or not in_degrees[v]]
+    while queue:
+        v = queue.pop()
+        if v not in members:
+            continue
+        members.discard(v)
+        sccs.append([v])
+        for w in _adjacent(forward_offsets, forward_targets, v, members):
+            in_degrees[w] -= 1
+            if not in_degrees[w]:
+                queue.append(w)
+        for w in _adjacent(backward_offsets, backward_targets, v, members):
+            out_degrees[w] -= 1
+            if not out_degrees[w]:
+                queue.append(w)
+
+
+def _reach(pivot, offsets, targets, members):
+    reached, stack = set([pivot]), [pivot]
+    while stack:
+        v = stack.pop()
+        for w in targets[offsets[v]:offsets[v + 1]]:
+            if w in members and w not in reached:
+                reached.add(w)
+                stack.append(w)
+    return reached
+
+
+def _tarjan(members, sccs):
+    """
+    Iterative Tarjan's algorithm on the subgraph induced by members.
+    """
+    forward_offsets, forward_targets = _csr[:2]
+    index, low, on_stack, stack = {}, {}, set(), []
+    for root in members:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(_adjacent(forward_offsets, forward_targets, root, members)))]
+        while work:
+            v, successors = work[-1]
+            for w in successors:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(_adjacent(forward_offsets, forward_targets, w, members))))
+                    break
+                elif w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    scc = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        scc.append(w)
+                        if w == v:
+                            break
+                    sccs.append(scc)
+
+
+def _decompose(arguments):
+    """
+    Find components of the subproblem (set of node numbers) which can be found in one step.
+    Return list of found components and list of remaining independent subproblems.
+    """
+    subproblem, threshold = arguments
+    members, sccs = set(subproblem), []
+    _trim(members, sccs)
+    if len(members) <= threshold:
+        _tarjan(members, sccs)
+        return sccs, []
+    pivot = random.choice(tuple(members)) # a random pivot splits the subproblem evenly on average
+    forward = _reach(pivot, _csr[0], _csr[1], members)
+    backward = _reach(pivot, _csr[2], _csr[3], members)
+    scc = forward & backward
+    sccs.append(list(scc))
+    subproblems = [forward - scc, backward - scc, members - forward - backward]
+    return sccs, [array('l', subproblem) for subproblem in subproblems if subproblem]
+
+
+def get_leaders_from_edges_in_parallel(edges, workers=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Same as get_leaders_from_edges (up to the order of groups and of nodes in them),
+    but independent subproblems are processed in a pool of worker processes.
+
+    workers: number of processes (number of CPUs by default); 1 means processing in the current process
+    threshold: subproblems not larger than this are solved sequentially by a single worker
+    """
+    nodes, csr = _build_csr(edges)
+    workers = multiprocessing.cpu_count() if workers is None else workers
+    _set_csr(*csr)
+    pool = multiprocessing.Pool(workers, initializer=_set_csr, initargs=csr) if workers > 1 else None
+    try:
+        map_function = map if pool is None else (lambda f, items: pool.imap_unordered(f, items, chunksize=1))
+        sccs = []
+        pending = [array('l', xrange(len(nodes)))] if nodes else []
+        while pending:
+            results = map_function(_decompose, [(subproblem, threshold) for subproblem in pending])
+            pending = []
+            for found, subproblems in results:
+                sccs.extend(found)
+                pending.extend(subproblems)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        _set_csr()
+    return [[nodes[v] for v in scc] for scc in sccs]
+
+
 def _get_leaders_from_file(file_name):
     with open(file_name) as f:
         edges_iterator = (map(int, line.strip().split()) for line in f)
@@ -84,6 +357,43 @@ def main():
     for leader in leaders:
         print(leader)
 
+class Tests(unittest.TestCase):
+    edges = [(1, 2), (2, 3), (3, 1), (3, 4), (4, 5), (5, 4), (6, 5), (1, 7)]
+
+    def test_condensation(self):
+        dag = condensation(self.edges)
+        self.assertEqual(sorted(map(sorted, dag.components)), [[1, 2, 3], [4, 5], [6], [7]])
+        for a, b in self.edges:
+            i, j = dag.component_of[a], dag.component_of[b]
+            self.assertTrue(i == j or j in dag.successors[i])
+            self.assertTrue(i <= j)
+        self.assertEqual(sorted(dag.sizes), [1, 1, 2, 3])
+
+    def test_reachability(self):
+        dag = condensation(self.edges)
+        self.assertTrue(dag.reaches(2, 5))
+        self.assertTrue(dag.reaches(3, 2))
+        self.assertTrue(dag.reaches(6, 4))
+        self.assertFalse(dag.reaches(5, 1))
+        self.assertFalse(dag.reaches(6, 7))
+        self.assertEqual(sorted(dag.reachable_components(dag.component_of[1])),
+            sorted(dag.component_of[node] for node in (1, 4, 7)))
+
+
+    def test_parallel_gives_the_same_groups(self):
+        expected = sorted(map(sorted, get_leaders_from_edges(self.edges)))
+        for workers, threshold in [(1, 0), (1, 100), (2, 0)]:
+            groups = get_leaders_from_edges_in_parallel(self.edges, workers=workers, threshold=threshold)
+            self.assertEqual(sorted(map(sorted, groups)), expected)
+
+    def test_parallel_on_random_graphs(self):
+        generator = random.Random(1)
+        for _ in xrange(20):
+            edges = [(generator.randrange(30), generator.randrange(30)) for _ in xrange(40)]
+            self.assertEqual(sorted(map(sorted, get_leaders_from_edges_in_parallel(edges, workers=1, threshold=3))),
+                sorted(map(sorted, get_leaders_from_edges(edges))))
+
+
 if __name__ == '__main__':
     main()
 